@@ -5,54 +5,97 @@ task management, and agent capabilities discovery.
 """
 
 import os
+import asyncio
 import logging
-from typing import Dict
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Request
+import functools
+from typing import AsyncIterator, Dict
+import orjson
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
 
 from a2a.models import (
     SendMessageRequest, Task, TaskStatus, TaskState, Message, Role, Part, FilePart, AgentCard
 )
-from a2a.task_manager import TaskManager
+from a2a.task_manager import TaskManager, create_task_manager, pop_artifacts
+from a2a.worker import submit
 from runner import run_agent
 from config import settings
-from tools.cad_tools import task_id_var
+from tools.cad_tools import task_id_var, output_subdir
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-task_manager = TaskManager()
+task_manager = create_task_manager(settings.REDIS_URL)
+
+_MEDIA_TYPES = {"stl": "model/stl", "step": "model/step"}
+
+# Seconds between keep-alive comments on an idle event stream
+_EVENT_KEEPALIVE = 15.0
+
+def _file_part(filename: str, kind: str) -> Part:
+    """Builds a downloadable file part for a generated artifact.
+
+    Args:
+        filename (str): The file path relative to the output directory.
+        kind (str): The artifact kind ("stl" or "step").
+
+    Returns:
+        Part: The file part pointing at the download endpoint.
+    """
+    return Part(file=FilePart(
+        file_with_uri=f"/download/{filename}",
+        name=filename.rpartition("/")[2],
+        media_type=_MEDIA_TYPES[kind]
+    ))
+
+def _collect_file_parts(task_id: str, artifacts: Dict[str, str], output_dir: str) -> list[Part]:
+    """Returns the file parts for a task, preferring the artifact registry.
+
+    Falls back to scanning the output directory when the CAD tools did not
+    register anything for the task (e.g. files written by another process).
+
+    Args:
+        task_id (str): The task identifier.
+        artifacts (Dict[str, str]): The files registered for the task, as returned by pop_artifacts.
+        output_dir (str): The directory to scan on fallback.
+
+    Returns:
+        list[Part]: A list of file parts.
+    """
+    if artifacts:
+        return [_file_part(artifacts[kind], kind) for kind in _MEDIA_TYPES if kind in artifacts]
+    return _find_generated_files(task_id, output_dir)
 
 def _find_generated_files(task_id: str, output_dir: str) -> list[Part]:
-    """Scans the output directory for files generated by the task.
+    """Scans the task's shard of the output directory for generated files.
 
     Args:
         task_id (str): The task identifier.
-        output_dir (str): The directory to scan.
+        output_dir (str): The output directory containing the shards.
 
     Returns:
         list[Part]: A list of file parts found.
     """
-    parts = []
-    if not os.path.exists(output_dir):
-        return parts
+    subdir = output_subdir(task_id)
+    shard_dir = os.path.join(output_dir, subdir)
+    if not os.path.exists(shard_dir):
+        return []
 
-    for filename in os.listdir(output_dir):
-        if not filename.startswith(task_id):
-            continue
-            
-        if filename.endswith(".stl"):
-            parts.append(Part(file=FilePart(
-                file_with_uri=f"/download/{filename}",
-                name=filename,
-                media_type="model/stl"
-            )))
-        elif filename.endswith(".step"):
-            parts.append(Part(file=FilePart(
-                file_with_uri=f"/download/{filename}",
-                name=filename,
-                media_type="model/step"
-            )))
-    return parts
+    found: Dict[str, str] = {}
+    with os.scandir(shard_dir) as entries:
+        for entry in entries:
+            # DirEntry.name comes straight from readdir, so no stat call is needed here
+            filename = entry.name
+            if not filename.startswith(task_id):
+                continue
+
+            kind = filename.rpartition(".")[2]
+            if kind in _MEDIA_TYPES and kind not in found:
+                found[kind] = f"{subdir}/{filename}"
+                # Stop reading the directory once both the STL and the STEP file are known
+                if len(found) == len(_MEDIA_TYPES):
+                    break
+    return [_file_part(found[kind], kind) for kind in _MEDIA_TYPES if kind in found]
 
 async def process_a2a_task(task_id: str, prompt: str, context_id: str) -> None:
     """Process an A2A task in the background.
@@ -63,21 +106,20 @@ async def process_a2a_task(task_id: str, prompt: str, context_id: str) -> None:
         context_id (str): The context or session ID.
     """
     logger.info(f"Processing A2A task {task_id} with prompt: {prompt}")
-    task_manager.update_task_status(task_id, TaskState.WORKING)
-    
     # Set the task ID in the context variable so tools can use it
     token = task_id_var.set(task_id)
     
     try:
+        await task_manager.update_task_status(task_id, TaskState.WORKING)
         final_response = ""
         # Execute the agent workflow via Runner
         async for response_chunk in run_agent(prompt=prompt, session_id=context_id):
             final_response = response_chunk
             # Optional: Update task with intermediate progress if supported
-            # task_manager.update_task_status(task_id, TaskState.WORKING, Message(role=Role.AGENT, parts=[Part(text=response_chunk)]))
+            # await task_manager.update_task_status(task_id, TaskState.WORKING, Message(role=Role.AGENT, parts=[Part(text=response_chunk)]))
 
-        # Check for generated files in outputs/ matching the task ID
-        file_parts = _find_generated_files(task_id, settings.OUTPUT_DIR)
+        # Look up the files generated for this task
+        file_parts = _collect_file_parts(task_id, pop_artifacts(task_id), settings.OUTPUT_DIR)
         parts = [Part(text=final_response)] + file_parts
 
         response_message = Message(
@@ -85,30 +127,41 @@ async def process_a2a_task(task_id: str, prompt: str, context_id: str) -> None:
             parts=parts
         )
         
-        task_manager.update_task_status(task_id, TaskState.COMPLETED, response_message)
+        await task_manager.update_task_status(task_id, TaskState.COMPLETED, response_message)
 
         logger.info(f"A2A task {task_id} completed successfully")
 
+    except asyncio.CancelledError:
+        # Cancelled on shutdown; finish the task so clients stop polling it
+        response_message = Message(
+            role=Role.AGENT,
+            parts=[Part(text="Generation was cancelled because the service is shutting down.")]
+        )
+        await task_manager.update_task_status(task_id, TaskState.FAILED, response_message)
+        logger.warning(f"A2A task {task_id} cancelled")
+        raise
+
     except Exception as e:
         error_msg = f"Internal error during generation: {str(e)}"
         response_message = Message(
             role=Role.AGENT,
             parts=[Part(text=error_msg)]
         )
-        task_manager.update_task_status(task_id, TaskState.FAILED, response_message)
+        await task_manager.update_task_status(task_id, TaskState.FAILED, response_message)
         logger.error(f"A2A task {task_id} exception: {e}")
 
     finally:
+        # Drop files registered by a run that failed, so the registry does not grow
+        pop_artifacts(task_id)
         # Reset the context variable
         task_id_var.reset(token)
 
 @router.post("/v1/message:send")
-async def a2a_send_message(request: SendMessageRequest, background_tasks: BackgroundTasks) -> Dict[str, Task]:
+async def a2a_send_message(request: SendMessageRequest) -> Dict[str, Task]:
     """Handle incoming A2A messages and start a background task.
 
     Args:
         request (SendMessageRequest): The incoming message request.
-        background_tasks (BackgroundTasks): FastAPI background tasks handler.
 
     Returns:
         Dict[str, Task]: A dictionary containing the created task.
@@ -116,52 +169,98 @@ async def a2a_send_message(request: SendMessageRequest, background_tasks: Backgr
     Raises:
         HTTPException: If the message content is empty.
     """
-    # Extract prompt from the first text part
-    prompt = ""
-    for part in request.message.parts:
-        if part.text:
-            prompt += part.text + "\n"
-    
-    if not prompt.strip():
+    # Extract prompt from the text parts
+    prompt = "\n".join(part.text for part in request.message.parts if part.text).strip()
+
+    if not prompt:
         raise HTTPException(status_code=400, detail="No text content found in message")
 
     # Create Task
-    task = task_manager.create_task(context_id=request.message.context_id)
+    task = await task_manager.create_task(context_id=request.message.context_id)
     
     # Start background processing
-    background_tasks.add_task(process_a2a_task, task.id, prompt.strip(), request.message.context_id)
+    await submit(process_a2a_task(task.id, prompt, request.message.context_id))
     
     return {"task": task}
 
-@router.get("/v1/tasks/{id}")
-async def a2a_get_task(id: str) -> Dict[str, Task]:
+@router.get("/v1/tasks/{id}", response_model=Dict[str, Task])
+async def a2a_get_task(id: str) -> ORJSONResponse:
     """Retrieve the status of a specific task.
 
+    The task is dumped once and serialized with orjson directly, skipping
+    FastAPI's response model validation on this frequently polled endpoint.
+
     Args:
         id (str): The task identifier.
 
     Returns:
-        Dict[str, Task]: A dictionary containing the task details.
+        ORJSONResponse: A JSON object containing the task details under "task".
 
     Raises:
         HTTPException: If the task is not found.
     """
-    task = task_manager.get_task(id)
+    task = await task_manager.get_task(id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
-    return {"task": task}
+    return ORJSONResponse({"task": task.model_dump(by_alias=True, mode="json")})
 
-@router.get("/v1/extendedAgentCard")
-async def a2a_get_agent_card(request: Request) -> AgentCard:
-    """Provide the extended agent card describing capabilities.
+async def _task_events(task_id: str) -> AsyncIterator[bytes]:
+    """Yield a server-sent event for every status change of a task.
+
+    The stream ends after the task reaches a terminal state or disappears.
 
     Args:
-        request (Request): The incoming HTTP request.
+        task_id (str): The task identifier.
+
+    Yields:
+        bytes: Encoded SSE frames carrying the task under "task".
+    """
+    last_timestamp = None
+    while True:
+        task = await task_manager.get_task(task_id)
+        if not task:
+            return
+        if task.status.timestamp_ns != last_timestamp:
+            last_timestamp = task.status.timestamp_ns
+            payload = orjson.dumps({"task": task.model_dump(by_alias=True, mode="json")})
+            yield b"data: " + payload + b"\n\n"
+            if TaskState(task.status.state) in TaskManager.TERMINAL_STATES:
+                return
+            # Re-read before waiting in case the task changed while the client was reading
+            continue
+        if not await task_manager.wait_for_update(task_id, _EVENT_KEEPALIVE):
+            yield b": keep-alive\n\n"
+
+@router.get("/v1/tasks/{id}/events")
+async def a2a_task_events(id: str) -> StreamingResponse:
+    """Stream status changes of a task as server-sent events.
+
+    Args:
+        id (str): The task identifier.
 
     Returns:
-        AgentCard: The agent card object.
+        StreamingResponse: A text/event-stream response with one event per change.
+
+    Raises:
+        HTTPException: If the task is not found.
+    """
+    if not await task_manager.get_task(id):
+        raise HTTPException(status_code=404, detail="Task not found")
+    return StreamingResponse(
+        _task_events(id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+def _build_agent_card(base_url: str) -> AgentCard:
+    """Build the agent card advertised at a base URL.
+
+    Args:
+        base_url (str): The externally visible base URL of the service.
+
+    Returns:
+        AgentCard: The agent card.
     """
-    base_url = str(request.base_url).rstrip("/")
     return AgentCard(
         identity={
             "name": "FormaAI 3D Agent",
@@ -182,14 +281,46 @@ async def a2a_get_agent_card(request: Request) -> AgentCard:
         ]
     )
 
-@router.get("/.well-known/agent-card.json")
-async def a2a_well_known_card(request: Request) -> AgentCard:
+@functools.lru_cache(maxsize=32)
+def _agent_card_json(base_url: str) -> bytes:
+    """Encode the agent card for a base URL.
+
+    The card only depends on the base URL, so the encoded bytes are cached.
+    The cache is bounded because the base URL comes from the request's Host header.
+
+    Args:
+        base_url (str): The externally visible base URL of the service.
+
+    Returns:
+        bytes: The JSON-encoded agent card.
+    """
+    return orjson.dumps(_build_agent_card(base_url).model_dump(by_alias=True, mode="json"))
+
+def _agent_card_response(request: Request) -> Response:
+    """Return the cached agent card for the request's base URL."""
+    base_url = str(request.base_url).rstrip("/")
+    return Response(content=_agent_card_json(base_url), media_type="application/json")
+
+@router.get("/v1/extendedAgentCard", response_model=AgentCard)
+async def a2a_get_agent_card(request: Request) -> Response:
+    """Provide the extended agent card describing capabilities.
+
+    Args:
+        request (Request): The incoming HTTP request.
+
+    Returns:
+        Response: The JSON-encoded agent card.
+    """
+    return _agent_card_response(request)
+
+@router.get("/.well-known/agent-card.json", response_model=AgentCard)
+async def a2a_well_known_card(request: Request) -> Response:
     """Serve the well-known agent card for discovery.
 
     Args:
         request (Request): The incoming HTTP request.
 
     Returns:
-        AgentCard: The agent card object.
+        Response: The JSON-encoded agent card.
     """
-    return await a2a_get_agent_card(request)
+    return _agent_card_response(request)
@@ -4,19 +4,22 @@ This module defines Pydantic models for tasks, messages, parts,
 and agent capabilities used in the A2A communication.
 """
 
+import functools
 from enum import Enum
 from typing import List, Optional, Union, Dict, Any
-from pydantic import BaseModel, Field, ConfigDict
-from datetime import datetime
+from pydantic import BaseModel, Field, ConfigDict, computed_field
+from datetime import datetime, timezone
 
+@functools.lru_cache(maxsize=None)
 def to_camel(string: str) -> str:
-    return "".join(word.capitalize() if i > 0 else word for i, word in enumerate(string.split("_")))
+    """Converts a snake_case field name to its camelCase alias."""
+    head, *tail = string.split("_")
+    return head + "".join(word.capitalize() for word in tail)
 
 class A2ABaseModel(BaseModel):
     model_config = ConfigDict(
         populate_by_name=True,
-        alias_generator=to_camel,
-        use_enum_values=True
+        alias_generator=to_camel
     )
 
 # Enums
@@ -78,9 +81,24 @@ class Message(A2ABaseModel):
 
 # Task
 class TaskStatus(A2ABaseModel):
+    """Represents the current status of a task.
+
+    Attributes:
+        state (TaskState): The current state of the task.
+        message (Optional[Message]): The latest message for the task.
+        timestamp_ns (Optional[int]): Time of the last update in Unix nanoseconds (internal).
+        timestamp (Optional[datetime]): Time of the last update, derived when serialized.
+    """
     state: TaskState
     message: Optional[Message] = None
-    timestamp: Optional[datetime] = None
+    timestamp_ns: Optional[int] = Field(default=None, exclude=True)
+
+    @computed_field
+    @property
+    def timestamp(self) -> Optional[datetime]:
+        if self.timestamp_ns is None:
+            return None
+        return datetime.fromtimestamp(self.timestamp_ns / 1e9, tz=timezone.utc)
 
 class Artifact(A2ABaseModel):
     # Simplified artifact representation
@@ -0,0 +1,145 @@
+"""Redis-backed task management for the A2A protocol.
+
+This module provides the RedisTaskManager class, which stores tasks in Redis
+so that several Uvicorn worker processes can serve the same tasks.
+"""
+
+import time
+from typing import Optional
+import redis.asyncio as redis
+from .models import Task, TaskStatus, TaskState, Message
+from .task_manager import TaskManager
+
+class RedisTaskManager(TaskManager):
+    """Stores tasks in Redis hashes.
+
+    Task metadata lives in the hash `task:{id}` and its message history in the
+    list `task:{id}:history`, capped at the last `max_history` messages. IDs of tasks that are still running are grouped
+    per state in the sets `tasks:{state}`. Tasks in a terminal state never
+    change again, so they are also kept in the inherited in-process LRU to spare
+    polling clients a Redis round-trip.
+
+    Only updates made by this process wake `wait_for_update`; changes written by
+    other workers are picked up when the wait times out.
+    """
+
+    def __init__(self, url: str, max_tasks: int = 1024, finished_ttl: float = 3600, max_history: int = 200,
+                 coalesce_window: float = 0.05):
+        """Initialize RedisTaskManager.
+
+        Args:
+            url (str): The Redis connection URL.
+            max_tasks (int): Size of the local cache of finished tasks.
+            finished_ttl (float): Seconds a finished task is kept in Redis.
+            max_history (int): Maximum number of messages kept in a task's history.
+            coalesce_window (float): Seconds non-terminal updates are batched before being written.
+        """
+        super().__init__(max_tasks=max_tasks, finished_ttl=finished_ttl, max_history=max_history,
+                         coalesce_window=coalesce_window)
+        self._redis = redis.from_url(url, decode_responses=True)
+
+    @staticmethod
+    def _key(task_id: str) -> str:
+        return f"task:{task_id}"
+
+    @staticmethod
+    def _history_key(task_id: str) -> str:
+        return f"task:{task_id}:history"
+
+    @staticmethod
+    def _state_key(state: str) -> str:
+        return f"tasks:{state}"
+
+    async def create_task(self, context_id: Optional[str] = None) -> Task:
+        """Create a new task and store it in Redis.
+
+        Args:
+            context_id (Optional[str]): The context ID. If None, a new one is generated.
+
+        Returns:
+            Task: The created task object.
+        """
+        task = self._new_task(context_id)
+        state = task.status.state.value
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._key(task.id), mapping={
+                "context_id": task.context_id,
+                "state": state,
+                "timestamp_ns": task.status.timestamp_ns,
+            })
+            pipe.sadd(self._state_key(state), task.id)
+            await pipe.execute()
+        return task
+
+    async def get_task(self, task_id: str) -> Optional[Task]:
+        """Retrieve a task by its ID.
+
+        Args:
+            task_id (str): The task identifier.
+
+        Returns:
+            Optional[Task]: The task object if found, else None.
+        """
+        cached = await super().get_task(task_id)
+        if cached:
+            return cached
+
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hgetall(self._key(task_id))
+            pipe.lrange(self._history_key(task_id), 0, -1)
+            fields, history = await pipe.execute()
+
+        if not fields:
+            return None
+
+        message = fields.get("message")
+        task = Task(
+            id=task_id,
+            context_id=fields.get("context_id") or None,
+            status=TaskStatus(
+                state=TaskState(fields["state"]),
+                message=Message.model_validate_json(message) if message else None,
+                timestamp_ns=int(fields["timestamp_ns"])
+            ),
+            history=[Message.model_validate_json(item) for item in history]
+        )
+        if TaskState(task.status.state) in self.TERMINAL_STATES:
+            self._remember(task)
+        return task
+
+    async def _apply_status(self, task_id: str, state: TaskState, message: Optional[Message] = None) -> None:
+        """Write a status update to Redis.
+
+        Finished tasks are removed from the per-state sets and expire after `finished_ttl` seconds.
+        A progress update that arrives after the task finished is dropped.
+
+        Args:
+            task_id (str): The task identifier.
+            state (TaskState): The new state of the task.
+            message (Optional[Message]): An optional message to append to history.
+        """
+        state = TaskState(state)
+        key = self._key(task_id)
+        async with self._lock:
+            previous = await self._redis.hget(key, "state")
+            if previous is None:
+                return
+            if TaskState(previous) in self.TERMINAL_STATES and state not in self.TERMINAL_STATES:
+                return
+
+            async with self._redis.pipeline(transaction=True) as pipe:
+                pipe.hset(key, mapping={"state": state.value, "timestamp_ns": time.time_ns()})
+                if message:
+                    message_json = message.model_dump_json()
+                    pipe.hset(key, "message", message_json)
+                    pipe.rpush(self._history_key(task_id), message_json)
+                    pipe.ltrim(self._history_key(task_id), -self.max_history, -1)
+
+                if state in self.TERMINAL_STATES:
+                    pipe.srem(self._state_key(previous), task_id)
+                    pipe.expire(key, int(self.finished_ttl))
+                    pipe.expire(self._history_key(task_id), int(self.finished_ttl))
+                else:
+                    pipe.smove(self._state_key(previous), self._state_key(state.value), task_id)
+                await pipe.execute()
+            self._notify(task_id)
@@ -4,40 +4,148 @@ This module provides the TaskManager class to create, retrieve,
 and update tasks in memory.
 """
 
-from typing import Dict, Optional
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import time
 import uuid
-from datetime import datetime
 from .models import Task, TaskStatus, TaskState, Message
 
+# Files produced for each task, keyed by task ID -> {"stl": filename, "step": filename}.
+# Populated by the CAD tools at write time so completion does not need to rescan outputs/.
+TASK_ARTIFACTS: Dict[str, Dict[str, str]] = {}
+
+def register_artifact(task_id: Optional[str], kind: str, filename: str) -> None:
+    """Record a file generated for a task.
+
+    Later registrations of the same kind replace earlier ones, so the registry
+    always points at the most recent attempt.
+
+    Args:
+        task_id (Optional[str]): The task identifier. Ignored if None.
+        kind (str): The artifact kind (e.g. "stl" or "step").
+        filename (str): The file name inside the output directory.
+    """
+    if task_id:
+        TASK_ARTIFACTS.setdefault(task_id, {})[kind] = filename
+
+def get_artifacts(task_id: str) -> Dict[str, str]:
+    """Return a copy of the files registered for a task without removing them.
+
+    Args:
+        task_id (str): The task identifier.
+
+    Returns:
+        Dict[str, str]: Mapping of artifact kind to file name (empty if none).
+    """
+    return dict(TASK_ARTIFACTS.get(task_id, {}))
+
+def pop_artifacts(task_id: str) -> Dict[str, str]:
+    """Remove and return the files registered for a task.
+
+    Args:
+        task_id (str): The task identifier.
+
+    Returns:
+        Dict[str, str]: Mapping of artifact kind to file name (empty if none).
+    """
+    return TASK_ARTIFACTS.pop(task_id, {})
+
 class TaskManager:
-    def __init__(self):
-        self._tasks: Dict[str, Task] = {}
+    """Keeps tasks in a bounded in-memory LRU store.
 
-    def create_task(self, context_id: Optional[str] = None) -> Task:
-        """Create a new task.
+    Attributes:
+        max_tasks (int): Maximum number of tasks kept before the least recently used is evicted.
+        finished_ttl (float): Seconds a task in a terminal state is kept before it is dropped.
+        max_history (int): Maximum number of messages kept in a task's history; older ones are dropped.
+        coalesce_window (float): Seconds non-terminal updates are held back so that only the
+            latest one per task is written. Terminal updates are always applied immediately.
+    """
+
+    TERMINAL_STATES = frozenset({
+        TaskState.COMPLETED, TaskState.FAILED, TaskState.CANCELLED, TaskState.REJECTED
+    })
+
+    def __init__(self, max_tasks: int = 10_000, finished_ttl: float = 3600, max_history: int = 200,
+                 coalesce_window: float = 0.05):
+        self._tasks: OrderedDict[str, Task] = OrderedDict()
+        self._updates: Dict[str, asyncio.Event] = {}
+        self._pending: Dict[str, Tuple[TaskState, Optional[Message]]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.max_tasks = max_tasks
+        self.finished_ttl = finished_ttl
+        self.max_history = max_history
+        self.coalesce_window = coalesce_window
+
+    @staticmethod
+    def _new_task(context_id: Optional[str] = None) -> Task:
+        """Build a new task in the SUBMITTED state.
 
         Args:
             context_id (Optional[str]): The context ID. If None, a new one is generated.
 
         Returns:
-            Task: The created task object.
+            Task: The new task object.
         """
         task_id = str(uuid.uuid4())
         if not context_id:
             context_id = str(uuid.uuid4())
             
-        task = Task(
+        # Every field is produced here, so skip validation and build the models directly
+        return Task.model_construct(
             id=task_id,
             context_id=context_id,
-            status=TaskStatus(
+            status=TaskStatus.model_construct(
                 state=TaskState.SUBMITTED,
-                timestamp=datetime.utcnow()
+                timestamp_ns=time.time_ns()
             )
         )
-        self._tasks[task_id] = task
+
+    def _remember(self, task: Task) -> None:
+        """Store a task in the LRU, evicting the oldest entries when full."""
+        self._tasks[task.id] = task
+        self._tasks.move_to_end(task.id)
+        while len(self._tasks) > self.max_tasks:
+            self._tasks.popitem(last=False)
+
+    def _notify(self, task_id: str) -> None:
+        """Wake everyone waiting in `wait_for_update` for this task."""
+        event = self._updates.pop(task_id, None)
+        if event:
+            event.set()
+
+    async def wait_for_update(self, task_id: str, timeout: float) -> bool:
+        """Wait until the status of a task changes in this process.
+
+        Args:
+            task_id (str): The task identifier.
+            timeout (float): Maximum number of seconds to wait.
+
+        Returns:
+            bool: True if the task was updated, False if the wait timed out.
+        """
+        event = self._updates.setdefault(task_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def create_task(self, context_id: Optional[str] = None) -> Task:
+        """Create a new task.
+
+        Args:
+            context_id (Optional[str]): The context ID. If None, a new one is generated.
+
+        Returns:
+            Task: The created task object.
+        """
+        task = self._new_task(context_id)
+        self._remember(task)
         return task
 
-    def get_task(self, task_id: str) -> Optional[Task]:
+    async def get_task(self, task_id: str) -> Optional[Task]:
         """Retrieve a task by its ID.
 
         Args:
@@ -46,20 +154,91 @@ class TaskManager:
         Returns:
             Optional[Task]: The task object if found, else None.
         """
-        return self._tasks.get(task_id)
+        task = self._tasks.get(task_id)
+        if task:
+            self._tasks.move_to_end(task_id)
+        return task
 
-    def update_task_status(self, task_id: str, state: TaskState, message: Optional[Message] = None) -> None:
+    async def update_task_status(self, task_id: str, state: TaskState, message: Optional[Message] = None) -> None:
         """Update the status of a task.
 
+        Non-terminal updates are coalesced for `coalesce_window` seconds, so a burst of
+        progress updates for one task results in a single write of the latest one.
+
         Args:
             task_id (str): The task identifier.
             state (TaskState): The new state of the task.
             message (Optional[Message]): An optional message to append to history.
         """
-        task = self.get_task(task_id)
-        if task:
+        if TaskState(state) in self.TERMINAL_STATES:
+            # Keep the last progress message in the history before finishing the task
+            pending = self._pending.pop(task_id, None)
+            if pending and pending[1]:
+                await self._apply_status(task_id, *pending)
+            await self._apply_status(task_id, state, message)
+            return
+
+        if self.coalesce_window <= 0:
+            await self._apply_status(task_id, state, message)
+            return
+
+        self._pending[task_id] = (state, message)
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        """Apply the coalesced updates once the window has passed."""
+        await asyncio.sleep(self.coalesce_window)
+        self._flusher = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Apply all coalesced status updates now."""
+        pending, self._pending = self._pending, {}
+        for task_id, (state, message) in pending.items():
+            await self._apply_status(task_id, state, message)
+
+    async def _apply_status(self, task_id: str, state: TaskState, message: Optional[Message] = None) -> None:
+        """Write a status update to the store.
+
+        Tasks reaching a terminal state are scheduled for removal after `finished_ttl` seconds.
+        A finished task is never moved back to a non-terminal state, so a progress update
+        flushed after the task finished is dropped.
+
+        Args:
+            task_id (str): The task identifier.
+            state (TaskState): The new state of the task.
+            message (Optional[Message]): An optional message to append to history.
+        """
+        async with self._lock:
+            task = self._tasks.get(task_id)
+            if not task:
+                return
+            if TaskState(task.status.state) in self.TERMINAL_STATES and TaskState(state) not in self.TERMINAL_STATES:
+                return
             task.status.state = state
-            task.status.timestamp = datetime.utcnow()
+            task.status.timestamp_ns = time.time_ns()
             if message:
                 task.status.message = message
                 task.history.append(message)
+                if len(task.history) > self.max_history:
+                    del task.history[:-self.max_history]
+            self._notify(task_id)
+
+        if TaskState(state) in self.TERMINAL_STATES:
+            asyncio.get_running_loop().call_later(self.finished_ttl, self._tasks.pop, task_id, None)
+
+def create_task_manager(redis_url: Optional[str] = None) -> TaskManager:
+    """Create the task manager for this process.
+
+    Args:
+        redis_url (Optional[str]): Redis connection URL. If set, tasks are stored in Redis
+            so that several Uvicorn workers share them; otherwise they are kept in memory.
+
+    Returns:
+        TaskManager: The task manager instance.
+    """
+    if redis_url:
+        from .redis_task_manager import RedisTaskManager
+        return RedisTaskManager(redis_url)
+    return TaskManager()
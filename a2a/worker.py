@@ -0,0 +1,77 @@
+"""Background execution of A2A tasks.
+
+This module runs submitted agent tasks on the event loop with a bounded
+level of concurrency, independently of the request that submitted them.
+"""
+
+import asyncio
+import logging
+from typing import Any, Coroutine, Optional, Set
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_semaphore = asyncio.Semaphore(settings.A2A_CONCURRENCY)
+_tasks: Set[asyncio.Task] = set()
+
+async def _run(coro: Coroutine[Any, Any, None]) -> None:
+    """Run a coroutine once a concurrency slot is free.
+
+    Args:
+        coro (Coroutine): The coroutine to run.
+    """
+    try:
+        await _semaphore.acquire()
+    except asyncio.CancelledError:
+        await _cancel_unstarted(coro)
+        raise
+    try:
+        await coro
+    finally:
+        _semaphore.release()
+
+async def _cancel_unstarted(coro: Coroutine[Any, Any, None]) -> None:
+    """Cancel a coroutine that was still waiting for a slot.
+
+    A coroutine that never started cannot run its cleanup, so it is started and
+    cancelled at its first suspension instead of being dropped.
+
+    Args:
+        coro (Coroutine): The coroutine to cancel.
+    """
+    task = asyncio.create_task(coro)
+    await asyncio.sleep(0)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+async def submit(coro: Coroutine[Any, Any, None]) -> asyncio.Task:
+    """Schedule a coroutine in the background task pool.
+
+    Args:
+        coro (Coroutine): The coroutine to run.
+
+    Returns:
+        asyncio.Task: The scheduled task.
+    """
+    task = asyncio.create_task(_run(coro))
+    # Keep a strong reference until the task is done so it is not garbage collected
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+async def shutdown(timeout: Optional[float] = None) -> None:
+    """Wait for outstanding background tasks to finish, cancelling the rest after a timeout.
+
+    Args:
+        timeout (Optional[float]): Maximum number of seconds to wait. Waits indefinitely if None.
+    """
+    if not _tasks:
+        return
+    logger.info("Waiting for %d background tasks to finish...", len(_tasks))
+    _, pending = await asyncio.wait(set(_tasks), timeout=timeout)
+    if not pending:
+        return
+    logger.warning("Cancelling %d background tasks still running after %s seconds", len(pending), timeout)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
@@ -10,10 +10,44 @@ class Settings:
     APP_NAME: str = "forma-ai-service"
     OUTPUT_DIR: str = os.getenv("OUTPUT_DIR", "outputs")
     RAG_PERSIST_DIRECTORY: str = os.getenv("RAG_PERSIST_DIRECTORY", "rag_db")
-    MODEL_NAME: str = "all-mpnet-base-v2"
+    # Origins allowed to call the API from a browser, comma-separated ("*" allows any)
+    CORS_ORIGINS: tuple[str, ...] = tuple(
+        origin.strip() for origin in os.getenv("CORS_ORIGINS", "*").split(",") if origin.strip()
+    )
+    # Optional Redis URL for sharing tasks between worker processes (in-memory if unset)
+    REDIS_URL: str | None = os.getenv("REDIS_URL")
+    # Maximum number of agent tasks processed concurrently
+    A2A_CONCURRENCY: int = int(os.getenv("A2A_CONCURRENCY", "16"))
+    # Seconds agent tasks get to finish on shutdown before they are cancelled and marked failed
+    A2A_SHUTDOWN_TIMEOUT: float = float(os.getenv("A2A_SHUTDOWN_TIMEOUT", "30"))
+    # Seconds a generated model is reused for an identical script (0 disables the cache)
+    CAD_CACHE_TTL: int = int(os.getenv("CAD_CACHE_TTL", "86400"))
+    # Number of worker processes used to render STL previews
+    RENDER_WORKERS: int = int(os.getenv("RENDER_WORKERS", "2"))
+    # Number of long-lived worker processes that execute build123d scripts
+    CAD_WORKERS: int = int(os.getenv("CAD_WORKERS", "2"))
+    # Maximum number of documentation pages scraped concurrently during RAG ingestion
+    RAG_FETCH_CONCURRENCY: int = int(os.getenv("RAG_FETCH_CONCURRENCY", "8"))
+    # Sentence-transformers embedding model, e.g. "all-MiniLM-L6-v2" to embed about 3x faster
+    # at some cost in recall; changing it rebuilds the RAG DB
+    MODEL_NAME: str = os.getenv("EMBEDDING_MODEL", "all-mpnet-base-v2")
+    # Device the embedding model runs on, e.g. "cuda" or "mps" to embed on a GPU
+    EMBEDDING_DEVICE: str = os.getenv("EMBEDDING_DEVICE", "cpu")
+    # Embedding backend: "torch", or "onnx" for the int8-quantized ONNX export of the model
+    # (needs optimum[onnxruntime]); changing it rebuilds the RAG DB
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "torch")
+    # Google Custom Search credentials; the designer falls back to DuckDuckGo if unset
+    GOOGLE_API_KEY: str | None = os.getenv("GOOGLE_API_KEY")
+    GOOGLE_CSE_ID: str | None = os.getenv("GOOGLE_CSE_ID")
+    # Reuse approved results for near-duplicate prompts of new sessions (same numbers required)
+    SEMANTIC_CACHE_ENABLED: bool = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+    # Minimum cosine similarity between prompts for a cache hit
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+    # Seconds a cached result stays valid
+    SEMANTIC_CACHE_TTL: int = int(os.getenv("SEMANTIC_CACHE_TTL", "86400"))
     
     # Build123d Documentation URLs
-    BUILD123D_DOCS_URLS: list[str] = [
+    BUILD123D_DOCS_URLS: tuple[str, ...] = (
         "https://build123d.readthedocs.io/en/latest/introduction.html",
         "https://build123d.readthedocs.io/en/latest/key_concepts.html",
         "https://build123d.readthedocs.io/en/latest/key_concepts_builder.html",
@@ -41,6 +75,6 @@ class Settings:
         "https://build123d.readthedocs.io/en/latest/tttt.html",
         "https://build123d.readthedocs.io/en/latest/tech_drawing_tutorial.html",
         "https://build123d.readthedocs.io/en/latest/OpenSCAD.html",
-    ]
+    )
 
 settings = Settings()
@@ -1,17 +1,18 @@
 """Example client for the FormaAI API.
 
-This script demonstrates how to send a prompt to the API and poll for the result.
+This script demonstrates how to send a prompt to the API and follow the task's
+progress over its server-sent event stream.
 """
 
+import json
 import requests
-import time
 import uuid
 import sys
 
 BASE_URL = "http://localhost:8001"
 
 def generate_3d_model(prompt: str) -> None:
-    """Send a generation request and poll for completion.
+    """Send a generation request and stream status updates until completion.
 
     Args:
         prompt (str): The description of the model to generate.
@@ -38,33 +39,34 @@ def generate_3d_model(prompt: str) -> None:
     task_id = task["id"]
     print(f"Task started. ID: {task_id}")
 
-    # 2. Poll for completion
-    while True:
-        status_resp = requests.get(f"{BASE_URL}/v1/tasks/{task_id}")
-        status_resp.raise_for_status()
-        task_data = status_resp.json()["task"]
-        state = task_data["status"]["state"]
-        
-        print(f"Status: {state}")
-        
-        if state == "TASK_STATE_COMPLETED":
-            result_msg = task_data["status"]["message"]
-            print("\nGeneration Complete!")
-            
-            # Extract file links
-            for part in result_msg["parts"]:
-                if part.get("file"):
-                    file_info = part["file"]
-                    print(f"File: {file_info['name']}")
-                    print(f"Download URL: {BASE_URL}{file_info.get('fileWithUri', file_info.get('file_with_uri'))}")
-            break
-            
-        elif state == "TASK_STATE_FAILED":
-            print("Generation Failed.")
-            print(task_data["status"].get("message", {}))
-            break
-            
-        time.sleep(2)
+    # 2. Follow the task's status updates
+    with requests.get(f"{BASE_URL}/v1/tasks/{task_id}/events", stream=True) as events:
+        events.raise_for_status()
+        for line in events.iter_lines(decode_unicode=True):
+            # Skip keep-alive comments and event separators
+            if not line or not line.startswith("data: "):
+                continue
+            task_data = json.loads(line[len("data: "):])["task"]
+            state = task_data["status"]["state"]
+
+            print(f"Status: {state}")
+
+            if state == "TASK_STATE_COMPLETED":
+                result_msg = task_data["status"]["message"]
+                print("\nGeneration Complete!")
+
+                # Extract file links
+                for part in result_msg["parts"]:
+                    if part.get("file"):
+                        file_info = part["file"]
+                        print(f"File: {file_info['name']}")
+                        print(f"Download URL: {BASE_URL}{file_info.get('fileWithUri', file_info.get('file_with_uri'))}")
+                break
+
+            elif state == "TASK_STATE_FAILED":
+                print("Generation Failed.")
+                print(task_data["status"].get("message", {}))
+                break
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
@@ -5,6 +5,8 @@ serves static files, and includes the A2A router.
 """
 
 import os
+import asyncio
+import contextlib
 # Suppress tokenizers warning
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
@@ -14,12 +16,18 @@ logging.getLogger("tornado.access").setLevel(logging.ERROR)
 logging.getLogger("google.generativeai").setLevel(logging.ERROR)
 
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
 from contextlib import asynccontextmanager
-from tools.rag_tool import RAGTool
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.responses import Response
+from starlette.types import Scope
+from tools.rag_tool import get_rag_tool
 from a2a.api import router as a2a_router
+from a2a import worker
+from tools import renderer, http_pool, browser_pool, cad_tools
 from config import settings
 
 # Configure logging
@@ -29,6 +37,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def _ingest_docs() -> None:
+    """Populate the RAG database in the background, logging any failure."""
+    try:
+        logger.info("Startup: Checking RAG database...")
+        rag = await asyncio.to_thread(get_rag_tool)
+        await rag.ingest_docs()
+        # Move the index load and model initialization off the first request
+        await asyncio.to_thread(rag.warm_up)
+    except Exception:
+        logger.exception("RAG ingestion failed")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage the application lifespan.
@@ -36,26 +55,53 @@ async def lifespan(app: FastAPI):
     Args:
         app (FastAPI): The FastAPI application instance.
     """
-    # Startup: Ingest docs if needed
-    logger.info("Startup: Checking RAG database...")
-    rag = RAGTool()
-    await rag.ingest_docs()
+    # uvicorn picks uvloop when it is installed; log it so a fallback to asyncio is visible
+    loop = asyncio.get_running_loop()
+    logger.info("Startup: Event loop %s.%s", type(loop).__module__, type(loop).__name__)
+    # Startup: Ingest docs in the background so requests are served right away
+    app.state.ingest_task = asyncio.create_task(_ingest_docs())
     yield
-    # Shutdown: Clean up if needed (optional)
+    app.state.ingest_task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await app.state.ingest_task
+    # Shutdown: Give agent tasks a bounded time to finish, then stop the render and CAD workers, HTTP pool and browser
+    await worker.shutdown(settings.A2A_SHUTDOWN_TIMEOUT)
+    renderer.shutdown_executor()
+    cad_tools.shutdown_executor()
+    await http_pool.aclose()
+    await browser_pool.aclose()
+
+class OutputFiles(StaticFiles):
+    """Serves generated files with long-lived caching headers.
+
+    Output file names contain the task ID and a random suffix and are never
+    rewritten, so clients may cache them indefinitely. Hidden entries such as
+    the CAD cache index are not served.
+    """
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if any(part.startswith(".") for part in path.split("/")):
+            raise StarletteHTTPException(status_code=404)
+        return await super().get_response(path, scope)
+
+    def file_response(self, *args, **kwargs) -> Response:
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
 
-app = FastAPI(title="FormaAI API", lifespan=lifespan)
+app = FastAPI(title="FormaAI API", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Allow anonymous origin. Currently, there is no authentication.
+    allow_origins=list(settings.CORS_ORIGINS),  # Any origin by default. Currently, there is no authentication.
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_headers=["Content-Type", "Authorization"],
 )
 
 # Serve the outputs directory so files can be downloaded
-os.makedirs("outputs", exist_ok=True)
-app.mount("/download", StaticFiles(directory="outputs"), name="outputs")
+os.makedirs(settings.OUTPUT_DIR, exist_ok=True)
+app.mount("/download", OutputFiles(directory=settings.OUTPUT_DIR), name="outputs")
 
 # --- A2A Protocol Implementation ---
 app.include_router(a2a_router)
@@ -1,10 +1,11 @@
 """Runner module for executing agent workflows.
 
-This module initializes the necessary services and the ControlFlowAgent,
-and provides a function to run the agent workflow.
+This module initializes the necessary services, creates the ControlFlowAgent
+on first use, and provides a function to run the agent workflow.
 """
 
 import asyncio
+import functools
 from typing import AsyncGenerator
 from google.adk.sessions import InMemorySessionService
 from google.adk.memory import InMemoryMemoryService
@@ -14,8 +15,14 @@ from sub_agents.control_flow.agent import ControlFlowAgent
 session_service = InMemorySessionService()
 memory_service = InMemoryMemoryService()
 
-# Initialize ControlFlowAgent
-control_flow_agent = ControlFlowAgent(session_service, memory_service)
+@functools.cache
+def get_control_flow_agent() -> ControlFlowAgent:
+    """Return the shared ControlFlowAgent, creating it on first use.
+
+    Returns:
+        ControlFlowAgent: The agent that orchestrates the workflow.
+    """
+    return ControlFlowAgent(session_service, memory_service)
 
 async def run_agent(prompt: str, session_id: str, user_id: str = "user") -> AsyncGenerator[str, None]:
     """Executes the agent workflow via ControlFlowAgent.
@@ -28,5 +35,5 @@ async def run_agent(prompt: str, session_id: str, user_id: str = "user") -> Asyn
     Yields:
         str: Chunks of the agent's response.
     """
-    async for chunk in control_flow_agent.run(prompt, session_id, user_id):
+    async for chunk in get_control_flow_agent().run(prompt, session_id, user_id):
         yield chunk
@@ -5,11 +5,13 @@ build123d code based on design specifications.
 """
 
 from google.adk.agents import LlmAgent
-from tools.rag_tool import RAGTool
-from tools.cad_tools import create_cad_model
+from tools.rag_tool import get_rag_tool
+from tools.cad_tools import create_cad_model_async
 from .prompt import SYSTEM_PROMPT
 import os
+import functools
 
+@functools.lru_cache(maxsize=4)
 def get_coder_agent(model_name: str = "gemini-3-pro-preview") -> LlmAgent:
     """Initialize and return the Coder Agent.
 
@@ -19,11 +21,11 @@ def get_coder_agent(model_name: str = "gemini-3-pro-preview") -> LlmAgent:
     Returns:
         LlmAgent: The configured Coder Agent instance.
     """
-    rag_tool = RAGTool()
+    rag_tool = get_rag_tool()
 
     return LlmAgent(
         model=model_name,
         name="CoderAgent",
         instruction=SYSTEM_PROMPT,
-        tools=[rag_tool.query, create_cad_model]
+        tools=[rag_tool.query, create_cad_model_async]
     )
@@ -4,9 +4,7 @@ This module contains the system instructions for the Coder Agent,
 defining its role, capabilities, and rules for generating build123d code.
 """
 
-import textwrap
-
-SYSTEM_PROMPT = textwrap.dedent("""
+SYSTEM_PROMPT = """
 You are a 3D modeling expert using the build123d Python library.
 Your task is to write a Python script that generates a 3D model based on the user's description.
 
@@ -53,4 +51,4 @@ Box(10, 10, 10, align=(Align.CENTER, Align.CENTER, Align.CENTER))
 - DO NOT return the code as text.
 - CALL `create_cad_model(script_code="...")`.
 - If you output text, you have FAILED.
-""")
+"""
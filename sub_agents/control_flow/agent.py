@@ -4,23 +4,79 @@ This module defines the ControlFlowAgent, which orchestrates the interaction
 between the Designer and Coder agents to generate 3D models.
 """
 
+import os
 import re
+import mimetypes
+import time
+import asyncio
+import functools
+from pathlib import Path
 from typing import AsyncGenerator
 from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
 from google.adk.memory import InMemoryMemoryService
+from google.adk.errors.already_exists_error import AlreadyExistsError
+from google.adk.events import Event
 from google.genai.types import Content, Part
 
 import logging
 from sub_agents.designer.agent import get_designer_agent
 from sub_agents.coder.agent import get_coder_agent
-from sub_agents.designer.agent import get_designer_agent
-from sub_agents.coder.agent import get_coder_agent
-from tools.renderer import render_stl
-from tools.cad_tools import create_cad_model
+from tools.renderer import render_stl_async
+from tools.cad_tools import create_cad_model, task_id_var, attempt_files_var
+from tools.semantic_cache import SemanticCache
+from a2a.task_manager import register_artifact, get_artifacts
+from config import settings
 
 logger = logging.getLogger(__name__)
 
+_STL_RE = re.compile(r"outputs/(?:[\w-]+/)?[\w-]+\.stl")
+_CODE_RE = re.compile(r"```python(.*?)```", re.DOTALL)
+
+_FEEDBACK_PROMPT = "Here is the rendered image of the generated model. Compare it against the original specification. If it is correct, start your reply with 'APPROVED' followed by a friendly message to the user describing the model and any nuances (e.g. 'Here is your 3d model...'). If it is incorrect, describe what is wrong so the coder can fix it."
+_APPROVED = "APPROVED"
+_ERROR_SPEC = "Original Specification:\n{original_spec}\n\nPrevious attempt failed with error:\n{error}\n\nPlease fix the code."
+_FEEDBACK_SPEC = "Original Specification:\n{original_spec}\n\nFeedback on previous attempt:\n{feedback}\n\nPlease fix the code based on this feedback."
+
+# Author of the cached response added to a session, as the designer would have answered
+_CACHE_AUTHOR = "DesignerAgent"
+
+_DONE = object()
+
+async def _buffered(gen: AsyncGenerator, size: int = 64) -> AsyncGenerator:
+    """Drains an async generator in a background task through a bounded queue.
+
+    The producer keeps running while the consumer is slow, until `size` items are waiting.
+
+    Args:
+        gen (AsyncGenerator): The generator to drain.
+        size (int): Maximum number of buffered items.
+
+    Yields:
+        The items of `gen`, in order. An exception raised by `gen` is re-raised here.
+    """
+    queue: asyncio.Queue = asyncio.Queue(size)
+
+    async def produce() -> None:
+        try:
+            async for item in gen:
+                await queue.put(item)
+        except Exception as e:
+            await queue.put(e)
+        await queue.put(_DONE)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        producer.cancel()
+
 class ControlFlowAgent:
     """Orchestrates the multi-agent workflow for 3D model generation.
 
@@ -28,40 +84,121 @@ class ControlFlowAgent:
         app_name (str): The name of the application.
         session_service: Service for managing user sessions.
         memory_service: Service for managing agent memory.
-        designer_agent: The initialized Designer Agent.
-        coder_agent: The initialized Coder Agent.
+        max_speculative (int): Maximum number of attempts run at once.
+        designer_agent: The Designer Agent, built on first use.
+        coder_agent: The Coder Agent, built on first use.
+        designer_runner: The shared Runner for the Designer Agent.
+        coder_runner: The shared Runner for the Coder Agent.
     """
 
-    def __init__(self, session_service: InMemorySessionService, memory_service: InMemoryMemoryService):
+    def __init__(self, session_service: InMemorySessionService, memory_service: InMemoryMemoryService,
+                 max_speculative: int = 2):
         """Initializes the ControlFlowAgent.
 
         Args:
             session_service (InMemorySessionService): Service for managing user sessions.
             memory_service (InMemoryMemoryService): Service for managing agent memory.
+            max_speculative (int): Maximum number of attempts run at once. 1 disables speculation.
         """
         self.app_name = "forma-ai-service"
         self.session_service = session_service
         self.memory_service = memory_service
-        
-        # Initialize sub-agents
-        self.designer_agent = get_designer_agent()
-        self.coder_agent = get_coder_agent()
+        # (user_id, session_id) pairs known to exist, so repeat requests skip the session service
+        self._known_sessions: set[tuple[str, str]] = set()
+        self.max_speculative = max_speculative
+        # Moving average of how long one coder -> render -> feedback attempt takes
+        self._attempt_seconds: float | None = None
+
+    # Sub-agents set up LLM clients and the RAG store, so they are only built when first run
+    @functools.cached_property
+    def designer_agent(self):
+        """The Designer Agent, initialized on first access."""
+        return get_designer_agent()
+
+    @functools.cached_property
+    def coder_agent(self):
+        """The Coder Agent, initialized on first access."""
+        return get_coder_agent()
+
+    # Runners hold no per-session state, so one per agent serves every request
+    @functools.cached_property
+    def designer_runner(self) -> Runner:
+        """The Runner for the Designer Agent, shared by the design and feedback steps."""
+        return Runner(
+            agent=self.designer_agent,
+            app_name=self.app_name,
+            session_service=self.session_service,
+            memory_service=self.memory_service
+        )
+
+    @functools.cached_property
+    def coder_runner(self) -> Runner:
+        """The Runner for the Coder Agent."""
+        return Runner(
+            agent=self.coder_agent,
+            app_name=self.app_name,
+            session_service=self.session_service,
+            memory_service=self.memory_service
+        )
+
+    @functools.cached_property
+    def semantic_cache(self) -> SemanticCache | None:
+        """The cache of approved results, or None if it is disabled."""
+        if not settings.SEMANTIC_CACHE_ENABLED:
+            return None
+        return SemanticCache()
 
-    async def _ensure_session(self, session_id: str, user_id: str) -> None:
+    async def _warm_up(self) -> None:
+        """Builds the sub-agents and their Runners in a thread, so loading the RAG store does not block the event loop."""
+        await asyncio.to_thread(lambda: (self.designer_runner, self.coder_runner))
+
+    async def _ensure_session(self, session_id: str, user_id: str) -> bool:
         """Ensures a session exists for the user.
 
         Args:
             session_id (str): The unique identifier for the session.
             user_id (str): The unique identifier for the user.
+
+        Returns:
+            bool: True if a new session was created.
         """
-        logger.info(f"ControlFlow: Ensuring session {session_id} exists for user {user_id}")
-        session = await self.session_service.get_session(app_name=self.app_name, user_id=user_id, session_id=session_id)
-        if not session:
-            logger.info(f"ControlFlow: Session not found. Creating new session...")
+        key = (user_id, session_id)
+        if key in self._known_sessions:
+            return False
+
+        logger.info("ControlFlow: Ensuring session %s exists for user %s", session_id, user_id)
+        try:
             await self.session_service.create_session(app_name=self.app_name, user_id=user_id, session_id=session_id)
-            logger.info("ControlFlow: Session created.")
-        else:
+        except AlreadyExistsError:
             logger.info("ControlFlow: Session found.")
+            created = False
+        else:
+            logger.info("ControlFlow: Session created.")
+            created = True
+        self._known_sessions.add(key)
+        return created
+
+    async def _append_turn(self, prompt: str, response: str, user_id: str, session_id: str) -> None:
+        """Records a request answered outside the session, from the semantic cache or a forked attempt.
+
+        Later requests of the session then see the conversation as if the agents had run in it.
+
+        Args:
+            prompt (str): The request that was answered.
+            response (str): The response text.
+            user_id (str): The unique identifier for the user.
+            session_id (str): The unique identifier for the session.
+        """
+        session = await self.session_service.get_session(app_name=self.app_name, user_id=user_id, session_id=session_id)
+        if session is None:
+            return
+        invocation_id = Event.new_id()
+        await self.session_service.append_event(session, Event(
+            invocation_id=invocation_id, author="user", content=Content(parts=[Part(text=prompt)], role="user")
+        ))
+        await self.session_service.append_event(session, Event(
+            invocation_id=invocation_id, author=_CACHE_AUTHOR, content=Content(parts=[Part(text=response)], role="model")
+        ))
 
     async def _run_designer_step(self, prompt: str, user_id: str, session_id: str) -> str:
         """Runs the Designer Agent to generate a specification.
@@ -75,104 +212,113 @@ class ControlFlowAgent:
             str: The generated design specification as a string.
         """
         logger.info("--- Running Designer Agent ---")
-        designer_runner = Runner(
-            agent=self.designer_agent,
-            app_name=self.app_name,
-            session_service=self.session_service,
-            memory_service=self.memory_service
-        )
         
         designer_input = Content(parts=[Part(text=prompt)], role="user")
         designer_output = ""
         
-        async for event in designer_runner.run_async(user_id=user_id, session_id=session_id, new_message=designer_input):
-            if event.is_final_response() and event.content and event.content.parts:
-                designer_output = event.content.parts[0].text
-                logger.info(f"ControlFlow: Designer Agent Output:\n{designer_output}")
+        async for event in self.designer_runner.run_async(user_id=user_id, session_id=session_id, new_message=designer_input):
+            if not event.is_final_response():
+                continue
+            parts = event.content and event.content.parts
+            if not parts:
+                continue
+            designer_output = parts[0].text
+            logger.info("ControlFlow: Designer Agent Output:\n%s", designer_output)
         
         return designer_output
 
-    async def _run_coder_step(self, spec: str, user_id: str, session_id: str, result_container: dict[str, str]) -> AsyncGenerator[str, None]:
+    async def _run_coder_step(self, spec: str, user_id: str, session_id: str, result_container: dict) -> AsyncGenerator[str, None]:
         """Runs the Coder Agent to generate code.
 
+        Each piece of output is scanned for an STL path once, as it arrives. The first one
+        found is stored under "stl" and starts rendering in the background while the coder
+        keeps streaming; the task is stored under "render_task".
+
         Args:
             spec (str): The design specification.
             user_id (str): The unique identifier for the user.
             session_id (str): The unique identifier for the session.
-            result_container (dict[str, str]): A dictionary to store the full output string.
+            result_container (dict): A dictionary to store the full output string, the STL path and the render task.
 
         Yields:
             str: Chunks of the generated text output.
         """
-        coder_runner = Runner(
-            agent=self.coder_agent,
-            app_name=self.app_name,
-            session_service=self.session_service,
-            memory_service=self.memory_service
-        )
         
         coder_input = Content(parts=[Part(text=f"Specification:\n{spec}")], role="user")
-        coder_output = ""
+        # Collected as pieces and joined once at the end
+        pieces: list[str] = []
         
-        async for event in coder_runner.run_async(user_id=user_id, session_id=session_id, new_message=coder_input):
-            if event.content:
-                 tool_output = self._parse_tool_output(event.content)
-                 if tool_output:
-                     coder_output += f"\nTool Output: {tool_output}"
-            
-            if event.is_final_response() and event.content and event.content.parts:
-                text_parts = [p.text for p in event.content.parts if p.text]
-                if text_parts:
-                    chunk = "\n" + "\n".join(text_parts)
-                    coder_output += chunk
-                    yield "\n".join(text_parts)
+        async for event in self.coder_runner.run_async(user_id=user_id, session_id=session_id, new_message=coder_input):
+            parts = event.content.parts if event.content else None
+            if not parts:
+                continue
+
+            tool_output = next((p.function_response.response for p in parts if p.function_response), None)
+            if tool_output:
+                pieces.append(f"Tool Output: {tool_output}")
+                self._scan_for_stl(pieces[-1], result_container)
+
+            if not event.is_final_response():
+                continue
+            text = "\n".join(p.text for p in parts if p.text)
+            if text:
+                pieces.append(text)
+                self._scan_for_stl(text, result_container)
+                yield text
         
+        coder_output = "".join(f"\n{piece}" for piece in pieces)
         result_container["output"] = coder_output
-        logger.info(f"ControlFlow: Coder Output Raw: {coder_output}")
+        logger.info("ControlFlow: Coder Output Raw: %s", coder_output)
 
-    def _parse_tool_output(self, content: Content) -> str | None:
-        """Parses tool output from the content."""
-        for part in content.parts:
-            if part.function_response:
-                return part.function_response.response
-        return None
+    @staticmethod
+    def _scan_for_stl(piece: str, result_container: dict) -> None:
+        """Records the first STL path in a new piece of coder output and starts rendering it.
 
-    def _extract_or_generate_stl(self, coder_output: str) -> tuple[str | None, str | None]:
+        Args:
+            piece (str): The newly received output.
+            result_container (dict): The coder step's result container.
+        """
+        if "stl" in result_container:
+            return
+        stl_match = _STL_RE.search(piece)
+        if stl_match:
+            result_container["stl"] = stl_match.group(0)
+            result_container["render_task"] = asyncio.create_task(render_stl_async(stl_match.group(0)))
+
+    def _extract_or_generate_stl(self, coder_output: str, stl_path: str | None = None) -> tuple[str | None, str | None]:
         """Extracts STL path from output or attempts fallback generation.
 
         Args:
             coder_output (str): The full text output from the Coder Agent.
+            stl_path (str | None): The STL path already found while the output streamed.
 
         Returns:
             tuple[str | None, str | None]: A tuple containing (stl_path, error_message).
                 If successful, stl_path is str and error_message is None.
                 If failed, stl_path is None and error_message is str.
         """
-        # Extract STL path
-        stl_match = re.search(r"outputs/[\w-]+\.stl", coder_output)
+        # Extract STL path, unless it was already found while streaming
+        if stl_path:
+            return stl_path, None
+        stl_match = _STL_RE.search(coder_output)
         
-        if stl_match:
-            return stl_match.group(0), None
-            
         if stl_match:
             return stl_match.group(0), None
             
         logger.info("ControlFlow: No STL file found in output. Checking for code block...")
         # Fallback: Check if code was outputted in markdown
-        code_match = re.search(r"```python(.*?)```", coder_output, re.DOTALL)
+        code_match = _CODE_RE.search(coder_output)
         if code_match:
-            logger.info("ControlFlow: Found code block. Executing fallback generation...")
-            code = code_match.group(1).strip()
             logger.info("ControlFlow: Found code block. Executing fallback generation...")
             code = code_match.group(1).strip()
             result = create_cad_model(code)
             if result["success"]:
-                logger.info(f"ControlFlow: Fallback generation successful. Files: {result['files']}")
+                logger.info("ControlFlow: Fallback generation successful. Files: %s", result['files'])
                 # We need to find the STL in the new result
                 # The result['files'] is a dict {'step': ..., 'stl': ...}
                 return result['files']['stl'], None
             else:
-                logger.error(f"ControlFlow: Fallback generation failed: {result['error']}")
+                logger.error("ControlFlow: Fallback generation failed: %s", result['error'])
                 return None, result['error']
         
         return None, "No code block or STL file found."
@@ -190,33 +336,29 @@ class ControlFlowAgent:
             str: The feedback text from the Designer Agent.
         """
         logger.info("--- Requesting Designer Feedback ---")
-        designer_runner = Runner(
-            agent=self.designer_agent,
-            app_name=self.app_name,
-            session_service=self.session_service,
-            memory_service=self.memory_service
-        )
         
-        with open(png_path, "rb") as f:
-            image_data = f.read()
+        image_data = await asyncio.to_thread(Path(png_path).read_bytes)
             
-        feedback_prompt = "Here is the rendered image of the generated model. Compare it against the original specification. If it is correct, reply with 'APPROVED' followed by a friendly message to the user describing the model and any nuances (e.g. 'Here is your 3d model...'). If it is incorrect, describe what is wrong so the coder can fix it."
-        
         feedback_input = Content(parts=[
-            Part(text=feedback_prompt),
-            Part(inline_data={"mime_type": "image/png", "data": image_data})
+            Part(text=_FEEDBACK_PROMPT),
+            Part(inline_data={"mime_type": mimetypes.guess_type(png_path)[0] or "image/png", "data": image_data})
         ], role="user")
         
         feedback_output = ""
-        async for event in designer_runner.run_async(user_id=user_id, session_id=session_id, new_message=feedback_input):
-            if event.is_final_response() and event.content and event.content.parts:
-                feedback_output = event.content.parts[0].text
-                logger.info(f"ControlFlow: Designer Feedback:\n{feedback_output}")
+        async for event in self.designer_runner.run_async(user_id=user_id, session_id=session_id, new_message=feedback_input):
+            if not event.is_final_response():
+                continue
+            parts = event.content and event.content.parts
+            if not parts:
+                continue
+            feedback_output = parts[0].text
+            logger.info("ControlFlow: Designer Feedback:\n%s", feedback_output)
         
         return feedback_output
 
 
-    async def _verify_model(self, stl_path: str, original_spec: str, user_id: str, session_id: str) -> tuple[bool, str, str | None]:
+    async def _verify_model(self, stl_path: str, original_spec: str, user_id: str, session_id: str,
+                            render_task: asyncio.Task | None = None) -> tuple[bool, str, str | None]:
         """Renders the model and gets feedback from the Designer.
 
         Args:
@@ -224,24 +366,26 @@ class ControlFlowAgent:
             original_spec: The original specification.
             user_id: User ID.
             session_id: Session ID.
+            render_task: A render of `stl_path` already started while the coder was running.
 
         Returns:
             tuple: (is_approved, feedback_text, png_path)
         """
-        logger.info(f"ControlFlow: Found STL at {stl_path}")
+        logger.info("ControlFlow: Found STL at %s", stl_path)
         
-        # Render STL
-        png_path = render_stl(stl_path)
+        # Render STL in a worker process to keep the event loop free
+        png_path = await (render_task or render_stl_async(stl_path))
         if not png_path:
             logger.error("ControlFlow: Failed to render STL.")
             return False, "Failed to render STL.", None
             
-        logger.info(f"ControlFlow: Rendered image at {png_path}")
+        logger.info("ControlFlow: Rendered image at %s", png_path)
         
         # Ask Designer for Feedback
         feedback_output = await self._get_designer_feedback(png_path, original_spec, user_id, session_id)
         
-        is_approved = "APPROVED" in feedback_output
+        # The Designer is asked to lead with the marker, so a rejection that mentions it does not count
+        is_approved = feedback_output.lstrip().startswith(_APPROVED)
         return is_approved, feedback_output, png_path
 
     async def _execute_loop_iteration(self, current_spec: str, original_spec: str, user_id: str, session_id: str) -> AsyncGenerator[str | tuple[bool, str], None]:
@@ -254,7 +398,8 @@ class ControlFlowAgent:
             session_id (str): The unique identifier for the session.
 
         Yields:
-            Union[str, tuple[bool, str]]: Chunks of text output, and finally a tuple (is_approved, next_spec).
+            Union[str, tuple[bool, str]]: Chunks of text output, and finally a tuple (is_approved, next_spec),
+                where an approved attempt carries the STL path instead of a next spec.
         """
         # 1. Generate Model
         # Note: We can't easily stream the coder output here if we refactor to _generate_model 
@@ -262,21 +407,31 @@ class ControlFlowAgent:
         # To preserve streaming, we'll keep the generator call here but use the helper logic for the rest.
         
         coder_result = {}
-        async for chunk in self._run_coder_step(current_spec, user_id, session_id, coder_result):
+        # Buffered so the coder keeps streaming while the client is slow to read
+        async for chunk in _buffered(self._run_coder_step(current_spec, user_id, session_id, coder_result)):
             yield chunk
             
         coder_output = coder_result.get("output", "")
-        stl_path, generation_error = self._extract_or_generate_stl(coder_output)
+        # The fallback may build the model, so keep the wait off the event loop
+        stl_path, generation_error = await asyncio.to_thread(
+            self._extract_or_generate_stl, coder_output, coder_result.get("stl")
+        )
+
+        # Keep the early render only if it is of the model that is being verified
+        render_task = coder_result.get("render_task")
+        if render_task and coder_result.get("stl") != stl_path:
+            render_task.cancel()
+            render_task = None
         
         if not stl_path:
-            logger.error(f"ControlFlow: Generation failed. Error: {generation_error}")
+            logger.error("ControlFlow: Generation failed. Error: %s", generation_error)
             logger.info("ControlFlow: Sending error back to Coder...")
-            next_spec = f"Original Specification:\n{original_spec}\n\nPrevious attempt failed with error:\n{generation_error}\n\nPlease fix the code."
+            next_spec = _ERROR_SPEC.format(original_spec=original_spec, error=generation_error)
             yield (False, next_spec)
             return
 
         # 2. Verify Model
-        is_approved, feedback_output, png_path = await self._verify_model(stl_path, original_spec, user_id, session_id)
+        is_approved, feedback_output, png_path = await self._verify_model(stl_path, original_spec, user_id, session_id, render_task)
         
         if png_path:
             yield f"Generated Image: {png_path}\n"
@@ -287,17 +442,88 @@ class ControlFlowAgent:
 
         if is_approved:
             logger.info("ControlFlow: Design Approved.")
-            friendly_msg = feedback_output.replace("APPROVED", "").strip()
+            friendly_msg = feedback_output.lstrip()[len(_APPROVED):].strip()
             if not friendly_msg:
                     friendly_msg = "Here is your 3D model."
             yield f"{friendly_msg}\n"
-            yield (True, "")
+            yield (True, stl_path)
         else:
             logger.info("ControlFlow: Design Rejected. Retrying...")
             yield f"Designer Feedback: {feedback_output}\n"
-            next_spec = f"Original Specification:\n{original_spec}\n\nFeedback on previous attempt:\n{feedback_output}\n\nPlease fix the code based on this feedback."
+            next_spec = _FEEDBACK_SPEC.format(original_spec=original_spec, feedback=feedback_output)
             yield (False, next_spec)
 
+    async def _run_attempt(self, current_spec: str, original_spec: str, user_id: str, session_id: str,
+                           queue: asyncio.Queue, files: dict) -> None:
+        """Runs one loop iteration, forwarding its output to a queue shared by concurrent attempts.
+
+        Args:
+            current_spec (str): The current specification to code.
+            original_spec (str): The original specification for reference.
+            user_id (str): The unique identifier for the user.
+            session_id (str): The unique identifier for the session.
+            queue (asyncio.Queue): Receives (task, item) pairs, ending with the result tuple
+                or the exception the attempt raised.
+            files (dict): Receives the files the attempt exports, by kind, instead of the
+                task's artifact registry. A cancelled attempt whose build finishes late
+                therefore cannot replace the winner's files.
+        """
+        # Each task runs in a copy of the context, so this only affects this attempt and its tool calls
+        attempt_files_var.set(files)
+        task = asyncio.current_task()
+        try:
+            async for item in self._execute_loop_iteration(current_spec, original_spec, user_id, session_id):
+                await queue.put((task, item))
+        except Exception as e:
+            await queue.put((task, e))
+
+    def _speculation_delay(self, attempts: dict[asyncio.Task, tuple[float, str, str]]) -> float | None:
+        """Returns how long to wait for output before launching a speculative attempt.
+
+        Args:
+            attempts (dict[asyncio.Task, tuple[float, str, str]]): Running attempts with their
+                start time, session ID and specification.
+
+        Returns:
+            float | None: Seconds until the newest attempt exceeds the typical attempt time,
+                or None if there is no estimate yet.
+        """
+        if self._attempt_seconds is None:
+            return None
+        newest = max(started for started, _, _ in attempts.values())
+        return max(0.0, newest + self._attempt_seconds - time.monotonic())
+
+    def _record_attempt_time(self, seconds: float) -> None:
+        """Folds the duration of a finished attempt into the moving average."""
+        if self._attempt_seconds is None:
+            self._attempt_seconds = seconds
+        else:
+            self._attempt_seconds = 0.8 * self._attempt_seconds + 0.2 * seconds
+
+    @staticmethod
+    def _register_model(task_id: str | None, stl_path: str) -> None:
+        """Registers the files of an approved model as the task's artifacts.
+
+        Args:
+            task_id (str | None): The task identifier.
+            stl_path (str): Path to the approved STL; the STEP export shares its base name.
+        """
+        step_path = stl_path[:-len(".stl")] + ".step"
+        register_artifact(task_id, "stl", os.path.relpath(stl_path, settings.OUTPUT_DIR))
+        if os.path.exists(step_path):
+            register_artifact(task_id, "step", os.path.relpath(step_path, settings.OUTPUT_DIR))
+
+    @staticmethod
+    def _register_files(task_id: str | None, files: dict) -> None:
+        """Registers the files collected by an attempt as the task's artifacts.
+
+        Args:
+            task_id (str | None): The task identifier.
+            files (dict): Mapping of artifact kind to file name inside the output directory.
+        """
+        for kind, filename in files.items():
+            register_artifact(task_id, kind, filename)
+
     async def run(self, prompt: str, session_id: str, user_id: str = "user") -> AsyncGenerator[str, None]:
         """Executes the agent workflow: Designer -> Coder -> Renderer -> Designer (Feedback) -> Coder (Fix).
 
@@ -309,29 +535,98 @@ class ControlFlowAgent:
         Yields:
             str: Chunks of text output describing the process and results.
         """
-        await self._ensure_session(session_id, user_id)
+        # Independent setup, so run it together rather than back to back
+        is_new_session, _ = await asyncio.gather(self._ensure_session(session_id, user_id), self._warm_up())
+
+        # Only the first request of a session is cached, as later ones depend on the conversation
+        task_id = task_id_var.get()
+        cache = self.semantic_cache if is_new_session and task_id else None
+        if cache:
+            cached = await asyncio.to_thread(cache.lookup, prompt)
+            if cached:
+                self._register_files(task_id, cached["files"])
+                await self._append_turn(prompt, cached["response"], user_id, session_id)
+                yield cached["response"]
+                return
 
         # Run Designer Agent first to build the initial task / specification. 
         designer_output = await self._run_designer_step(prompt, user_id, session_id)
         yield f"Design Specification:\n{designer_output[:100]}...\n"
 
         # After design specification is generated, run the loops of coder -> renderer -> designer -> coder until approved or max loops reached.
+        # An attempt that runs longer than usual gets a speculative twin; the first approved result wins.
         max_loops = 3
-        current_spec = designer_output
-        
-        for loop in range(max_loops):
-            logger.info(f"--- Running Coder Agent (Loop {loop+1}) ---")
-            
-            async for chunk in self._execute_loop_iteration(current_spec, designer_output, user_id, session_id):
-                if isinstance(chunk, tuple):
-                    # Final result of the iteration
-                    is_approved, next_spec = chunk
-                    if is_approved:
-                        return
-                    current_spec = next_spec
-                else:
+        queue: asyncio.Queue = asyncio.Queue()
+        attempts: dict[asyncio.Task, tuple[float, str, str]] = {}
+        attempt_files: dict[asyncio.Task, dict] = {}
+        fork_session_ids: list[str] = []
+        last_files: dict = {}
+        launched = 0
+
+        def launch(spec: str, attempt_session_id: str) -> None:
+            nonlocal launched
+            launched += 1
+            logger.info("--- Running Coder Agent (Loop %s) ---", launched)
+            files: dict = {}
+            task = asyncio.create_task(self._run_attempt(spec, designer_output, user_id, attempt_session_id, queue, files))
+            attempts[task] = (time.monotonic(), attempt_session_id, spec)
+            attempt_files[task] = files
+
+        launch(designer_output, session_id)
+        last_chunk: dict[asyncio.Task, str] = {}
+        try:
+            while attempts:
+                can_speculate = len(attempts) < self.max_speculative and launched < max_loops
+                try:
+                    task, item = await asyncio.wait_for(queue.get(), self._speculation_delay(attempts) if can_speculate else None)
+                except asyncio.TimeoutError:
+                    logger.info("ControlFlow: Attempt is running long, launching a speculative one")
+                    # The twin redoes the newest attempt, keeping the feedback or error that attempt is fixing
+                    _, _, slow_spec = max(attempts.values(), key=lambda attempt: attempt[0])
+                    # Speculative attempts get their own session so the conversations do not interleave
+                    fork_session_id = f"{session_id}~{launched}"
+                    await self._ensure_session(fork_session_id, user_id)
+                    fork_session_ids.append(fork_session_id)
+                    launch(f"{slow_spec}\n\n(attempt variant {launched})", fork_session_id)
+                    continue
+
+                if isinstance(item, Exception):
+                    raise item
+                if not isinstance(item, tuple):
                     # Streaming output
-                    yield chunk
+                    last_chunk[task] = item
+                    yield item
+                    continue
+
+                # Final result of the attempt
+                started, attempt_session_id, spec = attempts.pop(task)
+                last_files = attempt_files.pop(task)
+                self._record_attempt_time(time.monotonic() - started)
+                is_approved, next_spec = item
+                if is_approved:
+                    # Only the winning attempt's files become the task's artifacts
+                    if next_spec:
+                        self._register_model(task_id, next_spec)
+                    else:
+                        self._register_files(task_id, last_files)
+                    if attempt_session_id != session_id:
+                        # The fork is deleted below, so the main session keeps the winning result
+                        await self._append_turn(spec, last_chunk.get(task, ""), user_id, session_id)
+                    files = get_artifacts(task_id) if cache else None
+                    if files:
+                        await asyncio.to_thread(cache.store, prompt, last_chunk.get(task, ""), files)
+                    return
+                if launched < max_loops:
+                    launch(next_spec, attempt_session_id)
+        finally:
+            for task in attempts:
+                task.cancel()
+            if attempts:
+                await asyncio.gather(*attempts, return_exceptions=True)
+            for fork_session_id in fork_session_ids:
+                await self.session_service.delete_session(app_name=self.app_name, user_id=user_id, session_id=fork_session_id)
+                self._known_sessions.discard((user_id, fork_session_id))
         
-        # If loop finishes without approval
+        # If loop finishes without approval, return the last attempt's model as before
+        self._register_files(task_id, last_files)
         yield "I'm sorry, I was unable to generate the model correctly after multiple attempts.\n"
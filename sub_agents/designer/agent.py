@@ -5,11 +5,51 @@ technical specifications for 3D models based on user requests.
 """
 
 from google.adk.agents import LlmAgent
-from tools.search_tools import SearchTools
-from tools.rag_tool import RAGTool
+from tools.search_tools import SearchTools, get_search_tools
+from tools.rag_tool import get_rag_tool
 from .prompt import SYSTEM_PROMPT
 import os
+import asyncio
+import functools
 
+def _make_batch_lookup(search_tool: SearchTools, rag_tool):
+    """Build a tool that runs the web, image and documentation lookups concurrently.
+
+    Args:
+        search_tool (SearchTools): Provides the web and image searches.
+        rag_tool (RAGTool): Provides the documentation query.
+
+    Returns:
+        Callable: The async `batch_lookup` tool.
+    """
+    async def batch_lookup(web: str = "", image: str = "", doc: str = "") -> dict:
+        """Runs a web search, an image search and a build123d documentation query at the same time.
+
+        Args:
+            web (str): Web search query for dimensions or datasheets. Empty to skip.
+            image (str): Image search query for visual references. Empty to skip.
+            doc (str): build123d documentation query for code examples. Empty to skip.
+
+        Returns:
+            dict: The results keyed by "web", "image" and "doc", for the queries that were given.
+        """
+        lookups = {}
+        if web:
+            lookups["web"] = search_tool.web_search(web)
+        if image:
+            lookups["image"] = search_tool.image_search(image)
+        if doc:
+            lookups["doc"] = asyncio.to_thread(rag_tool.query, doc)
+
+        results = await asyncio.gather(*lookups.values(), return_exceptions=True)
+        return {
+            key: f"Lookup failed: {result}" if isinstance(result, Exception) else result
+            for key, result in zip(lookups, results)
+        }
+
+    return batch_lookup
+
+@functools.lru_cache(maxsize=4)
 def get_designer_agent(model_name: str = "gemini-3-pro-preview") -> LlmAgent:
     """Initialize and return the Designer Agent.
 
@@ -19,12 +59,15 @@ def get_designer_agent(model_name: str = "gemini-3-pro-preview") -> LlmAgent:
     Returns:
         LlmAgent: The configured Designer Agent instance.
     """
-    search_tool = SearchTools()
-    rag_tool = RAGTool()
+    search_tool = get_search_tools()
+    rag_tool = get_rag_tool()
     
     return LlmAgent(
         model=model_name,
         name="DesignerAgent",
         instruction=SYSTEM_PROMPT,
-        tools=[search_tool.web_search, rag_tool.query, search_tool.fetch_page, search_tool.image_search]
+        tools=[
+            _make_batch_lookup(search_tool, rag_tool), search_tool.web_search, rag_tool.query,
+            search_tool.fetch_page, search_tool.image_search
+        ]
     )
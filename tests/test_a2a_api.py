@@ -1,7 +1,10 @@
 import unittest
+import asyncio
+import json
 from unittest.mock import MagicMock, patch, AsyncMock
 from fastapi.testclient import TestClient
-from a2a.api import router, _find_generated_files, process_a2a_task
+from a2a.api import router, _find_generated_files, _collect_file_parts, process_a2a_task
+from a2a.task_manager import TaskManager, register_artifact, TASK_ARTIFACTS
 from a2a.models import Task, TaskState, TaskStatus, Message, Role, Part, FilePart
 
 class TestA2AAPI(unittest.TestCase):
@@ -12,9 +15,10 @@ class TestA2AAPI(unittest.TestCase):
         self.app.include_router(router)
         self.client = TestClient(self.app)
 
-    @patch('a2a.api.task_manager')
-    @patch('a2a.api.BackgroundTasks.add_task')
-    def test_send_message_success(self, mock_add_task, mock_task_manager):
+    @patch('a2a.api.task_manager', new_callable=AsyncMock)
+    @patch('a2a.api.submit', new_callable=AsyncMock)
+    @patch('a2a.api.process_a2a_task', new_callable=MagicMock)
+    def test_send_message_success(self, mock_process, mock_submit, mock_task_manager):
         """Test sending a message successfully."""
         mock_task = Task(id="task_1", status=TaskStatus(state=TaskState.SUBMITTED), context_id="ctx_1")
         mock_task_manager.create_task.return_value = mock_task
@@ -30,7 +34,8 @@ class TestA2AAPI(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json()["task"]["id"], "task_1")
         mock_task_manager.create_task.assert_called()
-        mock_add_task.assert_called()
+        mock_process.assert_called_with("task_1", "Create a cube", "ctx_1")
+        mock_submit.assert_called_with(mock_process.return_value)
 
     def test_send_message_empty(self):
         """Test sending an empty message."""
@@ -43,7 +48,7 @@ class TestA2AAPI(unittest.TestCase):
         })
         self.assertEqual(response.status_code, 400)
 
-    @patch('a2a.api.task_manager')
+    @patch('a2a.api.task_manager', new_callable=AsyncMock)
     def test_get_task_success(self, mock_task_manager):
         """Test retrieving a task."""
         mock_task = Task(id="task_1", status=TaskStatus(state=TaskState.COMPLETED), context_id="ctx_1")
@@ -54,28 +59,100 @@ class TestA2AAPI(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json()["task"]["status"]["state"], "TASK_STATE_COMPLETED")
 
-    @patch('a2a.api.task_manager')
+    @patch('a2a.api.task_manager', new_callable=AsyncMock)
     def test_get_task_not_found(self, mock_task_manager):
         """Test retrieving a non-existent task."""
         mock_task_manager.get_task.return_value = None
         response = self.client.get("/v1/tasks/task_999")
         self.assertEqual(response.status_code, 404)
 
+    def test_task_events_stream_until_terminal(self):
+        """Test that the event stream sends the task and closes once it is finished."""
+        manager = TaskManager()
+
+        async def make_finished_task():
+            task = await manager.create_task(context_id="ctx_1")
+            await manager.update_task_status(task.id, TaskState.COMPLETED)
+            return task
+
+        task = asyncio.run(make_finished_task())
+        with patch('a2a.api.task_manager', manager):
+            with self.client.stream("GET", f"/v1/tasks/{task.id}/events") as response:
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.headers["content-type"].startswith("text/event-stream"))
+                events = [line[len("data: "):] for line in response.iter_lines() if line.startswith("data: ")]
+
+        self.assertEqual(len(events), 1)
+        self.assertEqual(json.loads(events[0])["task"]["status"]["state"], "TASK_STATE_COMPLETED")
+
+    @patch('a2a.api.task_manager', new_callable=AsyncMock)
+    def test_task_events_not_found(self, mock_task_manager):
+        """Test streaming events of a non-existent task."""
+        mock_task_manager.get_task.return_value = None
+        response = self.client.get("/v1/tasks/task_999/events")
+        self.assertEqual(response.status_code, 404)
+
+    def test_agent_card(self):
+        """Test that both agent card endpoints serve the same card."""
+        response = self.client.get("/v1/extendedAgentCard")
+        well_known = self.client.get("/.well-known/agent-card.json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), well_known.json())
+        self.assertEqual(
+            response.json()["supportedInterfaces"][0]["url"],
+            "http://testserver/v1/message:send"
+        )
+
+    def test_routes_registered_once(self):
+        """Test that every A2A endpoint is registered exactly once."""
+        paths = [route.path for route in self.app.routes]
+        self.assertEqual(paths.count("/v1/message:send"), 1)
+        self.assertEqual(paths.count("/v1/tasks/{id}"), 1)
+        self.assertEqual(paths.count("/v1/tasks/{id}/events"), 1)
+
     @patch('os.path.exists')
-    @patch('os.listdir')
-    def test_find_generated_files(self, mock_listdir, mock_exists):
+    @patch('os.scandir')
+    def test_find_generated_files(self, mock_scandir, mock_exists):
         """Test finding generated files."""
         mock_exists.return_value = True
-        mock_listdir.return_value = ["task_1.stl", "task_1.step", "other.txt"]
+        entries = []
+        for name in ["other.txt", "task_1.step", "task_1.stl", "task_1_b.stl"]:
+            entry = MagicMock()
+            entry.name = name
+            entries.append(entry)
+        remaining = iter(entries)
+        mock_scandir.return_value.__enter__.return_value = remaining
         
         parts = _find_generated_files("task_1", "outputs")
         
         self.assertEqual(len(parts), 2)
         self.assertEqual(parts[0].file.name, "task_1.stl")
         self.assertEqual(parts[1].file.name, "task_1.step")
+        self.assertEqual(parts[0].file.file_with_uri, "/download/ta/task_1.stl")
+        mock_scandir.assert_called_once_with("outputs/ta")
+        # The scan stops as soon as both files are found
+        self.assertEqual(next(remaining).name, "task_1_b.stl")
+
+    @patch('a2a.api._find_generated_files')
+    def test_collect_file_parts_from_registry(self, mock_find_files):
+        """Test that registered artifacts are used without scanning outputs/."""
+        artifacts = {"step": "task_2_a.step", "stl": "task_2_a.stl"}
+
+        parts = _collect_file_parts("task_2", artifacts, "outputs")
 
+        self.assertEqual([p.file.name for p in parts], ["task_2_a.stl", "task_2_a.step"])
+        self.assertEqual(parts[0].file.file_with_uri, "/download/task_2_a.stl")
+        mock_find_files.assert_not_called()
+
+        # Without registered files the output directory is scanned
+        mock_find_files.return_value = []
+        self.assertEqual(_collect_file_parts("task_2", {}, "outputs"), [])
+        mock_find_files.assert_called_once_with("task_2", "outputs")
+
+class TestProcessA2ATask(unittest.IsolatedAsyncioTestCase):
     @patch('a2a.api.run_agent')
-    @patch('a2a.api.task_manager')
+    @patch('a2a.api.task_manager', new_callable=AsyncMock)
     @patch('a2a.api._find_generated_files')
     @patch('tools.cad_tools.task_id_var')
     async def test_process_a2a_task_success(self, mock_task_id_var, mock_find_files, mock_task_manager, mock_run_agent):
@@ -91,11 +168,12 @@ class TestA2AAPI(unittest.TestCase):
         
         mock_task_manager.update_task_status.assert_called()
         # Verify completed status
+        args, _ = mock_task_manager.update_task_status.call_args_list[-1]
         self.assertEqual(args[0], "task_1")
         self.assertEqual(args[1], TaskState.COMPLETED)
 
     @patch('a2a.api.run_agent')
-    @patch('a2a.api.task_manager')
+    @patch('a2a.api.task_manager', new_callable=AsyncMock)
     @patch('a2a.api._find_generated_files')
     @patch('tools.cad_tools.task_id_var')
     async def test_process_a2a_task_failure(self, mock_task_id_var, mock_find_files, mock_task_manager, mock_run_agent):
@@ -114,7 +192,41 @@ class TestA2AAPI(unittest.TestCase):
         args, _ = mock_task_manager.update_task_status.call_args_list[-1]
         self.assertEqual(args[0], "task_1")
         self.assertEqual(args[1], TaskState.FAILED)
-        self.assertIn("Agent Error", args[2]) # Error message should be passed
+        self.assertIn("Agent Error", args[2].parts[0].text) # Error message should be passed
+
+    @patch('a2a.api.run_agent')
+    @patch('a2a.api.task_manager', new_callable=AsyncMock)
+    async def test_process_a2a_task_failure_drops_artifacts(self, mock_task_manager, mock_run_agent):
+        """Test that files registered before a failure are removed from the registry."""
+        async def mock_agent_gen(*args, **kwargs):
+            register_artifact("task_3", "stl", "task_3_a.stl")
+            raise Exception("Agent Error")
+            yield "Should not be reached" # pragma: no cover
+
+        mock_run_agent.return_value = mock_agent_gen()
+
+        await process_a2a_task("task_3", "prompt", "ctx_1")
+
+        self.assertNotIn("task_3", TASK_ARTIFACTS)
+
+    @patch('a2a.api.run_agent')
+    @patch('a2a.api.task_manager', new_callable=AsyncMock)
+    async def test_process_a2a_task_cancelled(self, mock_task_manager, mock_run_agent):
+        """Test that a task cancelled on shutdown is marked failed."""
+        async def mock_agent_gen(*args, **kwargs):
+            await asyncio.sleep(10)
+            yield "Should not be reached" # pragma: no cover
+
+        mock_run_agent.return_value = mock_agent_gen()
+
+        task = asyncio.create_task(process_a2a_task("task_4", "prompt", "ctx_1"))
+        await asyncio.sleep(0)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+        args, _ = mock_task_manager.update_task_status.call_args_list[-1]
+        self.assertEqual(args[:2], ("task_4", TaskState.FAILED))
 
 if __name__ == '__main__':
     unittest.main()
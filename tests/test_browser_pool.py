@@ -0,0 +1,97 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+from tools.browser_pool import BrowserPool, _skip_heavy_resources
+
+def _mock_browser():
+    browser = MagicMock()
+    browser.is_connected.return_value = True
+    browser.close = AsyncMock()
+
+    async def new_context(**kwargs):
+        context = MagicMock(browser=browser, clear_cookies=AsyncMock(), route=AsyncMock())
+
+        async def new_page():
+            return MagicMock(context=context, close=AsyncMock())
+
+        context.new_page = new_page
+        return context
+
+    browser.new_context = new_context
+    return browser
+
+def _mock_playwright():
+    browser = _mock_browser()
+    pw = MagicMock(stop=AsyncMock())
+    pw.chromium.launch = AsyncMock(return_value=browser)
+    starter = MagicMock()
+    starter.return_value.start = AsyncMock(return_value=pw)
+    return starter, pw, browser
+
+class TestBrowserPool(unittest.IsolatedAsyncioTestCase):
+    async def test_browser_launched_once(self):
+        """Test that pages are lent from one browser instead of launching one per fetch."""
+        starter, pw, browser = _mock_playwright()
+        pool = BrowserPool(size=2)
+
+        with patch('tools.browser_pool.async_playwright', starter):
+            for _ in range(3):
+                async with pool.page() as page:
+                    pass
+                page.close.assert_awaited_once()
+
+        pw.chromium.launch.assert_awaited_once()
+        self.assertEqual(len(pool._contexts), 2)
+        page.context.route.assert_awaited_once_with("**/*", _skip_heavy_resources)
+
+    async def test_relaunches_disconnected_browser(self):
+        """Test that a browser that went away is replaced and its contexts are dropped."""
+        starter, pw, browser = _mock_playwright()
+        pool = BrowserPool(size=1)
+
+        with patch('tools.browser_pool.async_playwright', starter):
+            page = await pool.acquire()
+            browser.is_connected.return_value = False
+            new_browser = _mock_browser()
+            pw.chromium.launch.return_value = new_browser
+
+            await pool.start()
+            await pool.release(page)
+
+        self.assertEqual(pw.chromium.launch.await_count, 2)
+        browser.close.assert_awaited_once()
+        self.assertEqual([context.browser for context in pool._contexts], [new_browser])
+
+    async def test_waiter_gets_page_after_relaunch(self):
+        """Test that a caller waiting for a page is served by the relaunched browser."""
+        starter, pw, browser = _mock_playwright()
+        pool = BrowserPool(size=1)
+
+        with patch('tools.browser_pool.async_playwright', starter):
+            page = await pool.acquire()
+            waiter = asyncio.create_task(pool.acquire())
+            await asyncio.sleep(0)
+
+            browser.is_connected.return_value = False
+            new_browser = _mock_browser()
+            pw.chromium.launch.return_value = new_browser
+            await pool.start()
+            await pool.release(page)
+
+            second = await asyncio.wait_for(waiter, timeout=1)
+
+        self.assertIs(second.context.browser, new_browser)
+
+    async def test_skips_heavy_resources(self):
+        """Test that images and stylesheets are aborted while documents still load."""
+        for resource_type, aborted in (("image", True), ("stylesheet", True), ("document", False), ("script", False)):
+            route = MagicMock(abort=AsyncMock(), continue_=AsyncMock())
+            route.request.resource_type = resource_type
+
+            await _skip_heavy_resources(route)
+
+            self.assertEqual(route.abort.await_count, int(aborted))
+            self.assertEqual(route.continue_.await_count, int(not aborted))
+
+if __name__ == '__main__':
+    unittest.main()
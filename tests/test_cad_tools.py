@@ -1,46 +1,170 @@
 import unittest
 from unittest.mock import MagicMock, patch
 import os
-from tools.cad_tools import create_cad_model, render_cad_model, _execute_and_export, _render_worker
+import time
+import tempfile
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import build123d  # loaded before the tests patch exec, which its import uses
+from google.adk.tools import FunctionTool
+from tools.time_limit import JobTimeout, call_with_time_limit
+from tools.cad_tools import (
+    create_cad_model, create_cad_model_async, render_cad_model, _execute_and_export, _render_view,
+    _store_cached_model, _lookup_cached_model, _cache_path, _format_error, _build123d_scope, task_id_var,
+    attempt_files_var, shutdown_executor
+)
 
 class TestCadTools(unittest.TestCase):
 
-    @patch('tools.cad_tools.multiprocessing.Pool')
+    @patch('tools.cad_tools._get_executor')
     @patch('tools.cad_tools.task_id_var')
     @patch('tools.cad_tools.uuid')
-    def test_create_cad_model_success(self, mock_uuid, mock_task_id_var, mock_pool):
+    def test_create_cad_model_success(self, mock_uuid, mock_task_id_var, mock_executor):
         """Test successful CAD model creation."""
         mock_task_id_var.get.return_value = "task_123"
         mock_uuid.uuid4.return_value.hex = "abcdef12"
         
-        mock_pool_instance = mock_pool.return_value.__enter__.return_value
-        mock_async_result = MagicMock()
-        mock_async_result.get.return_value = {"success": True, "files": {"stl": "path/to/stl"}}
-        mock_pool_instance.apply_async.return_value = mock_async_result
+        mock_submit = mock_executor.return_value.submit
+        mock_submit.return_value.result.return_value = {"success": True, "files": {"stl": "path/to/stl"}}
 
         result = create_cad_model("print('hello')")
         
         self.assertTrue(result["success"])
         self.assertEqual(result["files"]["stl"], "path/to/stl")
-        mock_pool_instance.apply_async.assert_called()
+        mock_submit.assert_called()
 
-    @patch('tools.cad_tools.multiprocessing.Pool')
-    def test_create_cad_model_timeout(self, mock_pool):
-        """Test CAD model creation timeout."""
-        import multiprocessing
-        mock_pool_instance = mock_pool.return_value.__enter__.return_value
-        mock_async_result = MagicMock()
-        mock_async_result.get.side_effect = multiprocessing.TimeoutError
-        mock_pool_instance.apply_async.return_value = mock_async_result
+    @patch('tools.cad_tools.register_artifact')
+    @patch('tools.cad_tools._get_executor')
+    @patch('tools.cad_tools.task_id_var')
+    def test_create_cad_model_registers_artifacts(self, mock_task_id_var, mock_executor, mock_register):
+        """Test that generated files are registered against the task."""
+        mock_task_id_var.get.return_value = "task_123"
+
+        mock_executor.return_value.submit.return_value.result.return_value = {
+            "success": True,
+            "files": {"step": "outputs/task_123_a.step", "stl": "outputs/task_123_a.stl"}
+        }
+
+        create_cad_model("print('hello')")
+
+        mock_register.assert_any_call("task_123", "step", "task_123_a.step")
+        mock_register.assert_any_call("task_123", "stl", "task_123_a.stl")
+
+    @patch('tools.cad_tools.register_artifact')
+    @patch('tools.cad_tools._get_executor')
+    def test_create_cad_model_collects_attempt_files(self, mock_executor, mock_register):
+        """Test that files built inside a control-flow attempt are kept for that attempt only."""
+        mock_executor.return_value.submit.return_value.result.return_value = {
+            "success": True, "files": {"stl": "outputs/ta/task_123_a.stl"}
+        }
+        files = {}
+        token = attempt_files_var.set(files)
+        self.addCleanup(attempt_files_var.reset, token)
+
+        create_cad_model("print('hello')")
+
+        self.assertEqual(files, {"stl": "ta/task_123_a.stl"})
+        mock_register.assert_not_called()
+
+    @patch('tools.cad_tools.register_artifact')
+    @patch('tools.cad_tools._get_executor')
+    @patch('tools.cad_tools.task_id_var')
+    def test_create_cad_model_reuses_identical_script(self, mock_task_id_var, mock_executor, mock_register):
+        """Test that an identical script reuses the earlier export instead of executing again."""
+        mock_task_id_var.get.return_value = "task_123"
+        with tempfile.TemporaryDirectory() as tmp, \
+             patch('tools.cad_tools.OUTPUT_DIR', tmp), \
+             patch('tools.cad_tools.CAD_CACHE_DIR', os.path.join(tmp, ".cad_cache")):
+            stl_path = os.path.join(tmp, "first.stl")
+            with open(stl_path, "w") as f:
+                f.write("solid")
+
+            mock_submit = mock_executor.return_value.submit
+            mock_submit.return_value.result.return_value = {
+                "success": True, "files": {"stl": stl_path}
+            }
+
+            create_cad_model("result = Box(1, 1, 1)")
+            result = create_cad_model("result = Box(1, 1, 1)")
+
+            self.assertEqual(mock_submit.call_count, 1)
+            self.assertTrue(result["success"])
+            self.assertNotEqual(result["files"]["stl"], stl_path)
+            with open(result["files"]["stl"]) as f:
+                self.assertEqual(f.read(), "solid")
+
+    def test_lookup_cached_model_from_memory(self):
+        """Test that a stored entry is served from memory without reading the index file."""
+        with tempfile.TemporaryDirectory() as tmp, \
+             patch('tools.cad_tools.CAD_CACHE_DIR', tmp):
+            stl_path = os.path.join(tmp, "model.stl")
+            with open(stl_path, "w") as f:
+                f.write("solid")
+
+            _store_cached_model("result = Box(2, 2, 2)", {"stl": stl_path})
+            os.remove(_cache_path("result = Box(2, 2, 2)"))
+
+            self.assertEqual(_lookup_cached_model("result = Box(2, 2, 2)"), {"stl": stl_path})
+
+            # A model whose files are gone is no longer served
+            os.remove(stl_path)
+            self.assertIsNone(_lookup_cached_model("result = Box(2, 2, 2)"))
+
+    @patch('tools.cad_tools._get_executor')
+    def test_create_cad_model_timeout(self, mock_executor):
+        """Test CAD model creation timeout reported by the worker."""
+        mock_executor.return_value.submit.return_value.result.side_effect = JobTimeout
 
         result = create_cad_model("print('hello')")
         
         self.assertFalse(result["success"])
         self.assertIn("timed out", result["error"])
 
+    @patch('tools.cad_tools.shutdown_executor')
+    @patch('tools.cad_tools._get_executor')
+    def test_create_cad_model_stuck_worker_restarts_pool(self, mock_executor, mock_shutdown):
+        """Test that a worker that ignores its time limit gets the pool restarted."""
+        mock_executor.return_value.submit.return_value.result.side_effect = FutureTimeoutError
+
+        result = create_cad_model("print('hello')")
+
+        self.assertFalse(result["success"])
+        self.assertIn("timed out", result["error"])
+        mock_shutdown.assert_called_once_with(terminate=True, executor=mock_executor.return_value)
+
+    @patch('tools.cad_tools.settings.CAD_CACHE_TTL', 0)
+    @patch('tools.cad_tools.shutdown_executor')
+    @patch('tools.cad_tools._get_executor')
+    def test_create_cad_model_queued_job_is_not_stuck(self, mock_executor, mock_shutdown):
+        """Test that time spent waiting behind other jobs does not count against the watchdog."""
+        future = mock_executor.return_value.submit.return_value
+        # Still queued for three polls, then picked up and finished
+        future.result.side_effect = [FutureTimeoutError] * 3 + [{"success": True, "files": {}}]
+        future.running.return_value = False
+
+        result = create_cad_model("print('hello')")
+
+        self.assertTrue(result["success"])
+        mock_shutdown.assert_not_called()
+
+    def test_shutdown_executor_ignores_replaced_pool(self):
+        """Test that a failure in an old pool does not shut down the pool that replaced it."""
+        current = MagicMock()
+        with patch('tools.cad_tools._executor', current):
+            shutdown_executor(terminate=True, executor=MagicMock())
+            current.shutdown.assert_not_called()
+
+            shutdown_executor(terminate=True, executor=current)
+            current.shutdown.assert_called_once_with(wait=False, cancel_futures=True)
+
+    def test_call_with_time_limit_interrupts_job(self):
+        """Test that a job running past its limit is interrupted inside the worker."""
+        with self.assertRaises(JobTimeout):
+            call_with_time_limit(1, time.sleep, 5)
+
     @patch('tools.cad_tools.validate_code')
-    @patch('tools.cad_tools.export_step')
-    @patch('tools.cad_tools.export_stl')
+    @patch('build123d.export_step')
+    @patch('build123d.export_stl')
     @patch('builtins.exec')
     def test_execute_and_export_success(self, mock_exec, mock_export_stl, mock_export_step, mock_validate):
         """Test _execute_and_export logic."""
@@ -75,28 +199,111 @@ class TestCadTools(unittest.TestCase):
         mock_export_step.assert_called()
         mock_export_stl.assert_called()
 
-    @patch('tools.cad_tools.multiprocessing.Pool')
-    @patch('os.path.exists')
-    def test_render_cad_model_success(self, mock_exists, mock_pool):
+    def test_build123d_scope_is_public_api_only(self):
+        """Test that scripts see build123d's public API but not the modules it imports."""
+        scope = _build123d_scope()
+
+        self.assertIs(scope["Box"], build123d.Box)
+        self.assertIn("BuildPart", scope)
+        self.assertNotIn("os", scope)
+        self.assertNotIn("sys", scope)
+
+    def test_format_error_truncates_deep_traceback(self):
+        """Test that a deep traceback is cut down to its innermost frames."""
+        def recurse(n):
+            if n == 0:
+                raise ValueError("boom")
+            recurse(n - 1)
+
+        try:
+            recurse(50)
+        except ValueError as e:
+            error = _format_error("Execution failed", e)
+
+        self.assertTrue(error.startswith("Execution failed: boom\n"))
+        self.assertIn("ValueError: boom", error)
+        self.assertLessEqual(error.count("in recurse"), 5)
+
+    @patch('tools.cad_tools._get_executor')
+    def test_render_cad_model_success(self, mock_executor):
         """Test successful rendering."""
-        mock_exists.return_value = True
-        
-        mock_pool_instance = mock_pool.return_value.__enter__.return_value
-        mock_async_result = MagicMock()
-        mock_async_result.get.return_value = {"success": True, "images": ["img1.png"]}
-        mock_pool_instance.apply_async.return_value = mock_async_result
+        mock_submit = mock_executor.return_value.submit
+        mock_submit.side_effect = lambda wrapper, seconds, func, stl, out, base, view: MagicMock(
+            **{"result.return_value": {"success": True, "image": f"{base}_{view}.png"}}
+        )
 
-        result = render_cad_model("test.stl")
+        with tempfile.TemporaryDirectory() as tmp:
+            stl_path = os.path.join(tmp, "test.stl")
+            with open(stl_path, "wb") as f:
+                f.write(b"\0" * 134)
+            result = render_cad_model(stl_path)
         
         self.assertTrue(result["success"])
-        self.assertEqual(result["images"], ["img1.png"])
+        self.assertEqual(result["images"], ["test_iso.png", "test_top.png", "test_front.png", "test_right.png"])
+        self.assertEqual(mock_submit.call_count, 4)
+
+    def test_render_view_writes_png(self):
+        """Test that a single view is rendered to its own PNG."""
+        mock_pv = MagicMock()
+        plotter = mock_pv.Plotter.return_value
+
+        with tempfile.TemporaryDirectory() as tmp, \
+             patch.dict('sys.modules', {'pyvista': mock_pv}), \
+             patch('tools.cad_tools.setup_headless'):
+            stl_path = os.path.join(tmp, "model.stl")
+            with open(stl_path, "w") as f:
+                f.write("solid")
+            result = _render_view(stl_path, tmp, "model", "top")
+
+            self.assertTrue(result["success"])
+            self.assertEqual(result["image"], os.path.join(tmp, "model_top.png"))
+        plotter.view_xy.assert_called_once()
+        plotter.screenshot.assert_called_once_with(result["image"])
 
     def test_render_cad_model_file_not_found(self):
         """Test rendering when file does not exist."""
-        with patch('os.path.exists', return_value=False):
-            result = render_cad_model("nonexistent.stl")
-            self.assertFalse(result["success"])
-            self.assertEqual(result["error"], "STL file not found.")
+        result = render_cad_model("nonexistent.stl")
+        self.assertFalse(result["success"])
+        self.assertEqual(result["error"], "STL file not found.")
+
+    @patch('tools.cad_tools._get_executor')
+    def test_render_cad_model_empty_file(self, mock_executor):
+        """Test that an empty STL fails without starting any render jobs."""
+        with tempfile.TemporaryDirectory() as tmp:
+            stl_path = os.path.join(tmp, "empty.stl")
+            open(stl_path, "wb").close()
+            result = render_cad_model(stl_path)
+
+        self.assertFalse(result["success"])
+        self.assertEqual(result["error"], "STL file is empty or truncated.")
+        mock_executor.assert_not_called()
+
+class TestCreateCadModelAsync(unittest.IsolatedAsyncioTestCase):
+
+    async def test_builds_off_the_event_loop(self):
+        """Test that the Coder's tool waits for the build in a thread, keeping the task ID."""
+        calls = []
+
+        def fake_create(script_code):
+            calls.append((script_code, threading.current_thread(), task_id_var.get()))
+            return {"success": True, "files": {}}
+
+        token = task_id_var.set("task_123")
+        self.addCleanup(task_id_var.reset, token)
+        with patch('tools.cad_tools.create_cad_model', side_effect=fake_create):
+            result = await create_cad_model_async("result = Box(1, 1, 1)")
+
+        self.assertTrue(result["success"])
+        script_code, thread, task_id = calls[0]
+        self.assertEqual(script_code, "result = Box(1, 1, 1)")
+        self.assertIsNot(thread, threading.main_thread())
+        self.assertEqual(task_id, "task_123")
+
+    def test_tool_keeps_sync_name_and_description(self):
+        """Test that the Coder sees the same tool as before."""
+        tool = FunctionTool(create_cad_model_async)
+        self.assertEqual(tool.name, "create_cad_model")
+        self.assertEqual(tool.description, FunctionTool(create_cad_model).description)
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,10 +1,14 @@
+import asyncio
+import tempfile
 import unittest
 from unittest.mock import MagicMock, patch, AsyncMock, create_autospec
 from google.adk.sessions import InMemorySessionService
 from google.adk.memory import InMemoryMemoryService
 from google.adk.runners import Event
+from google.adk.errors.already_exists_error import AlreadyExistsError
 from google.genai.types import Content, Part, FunctionResponse
-from sub_agents.control_flow.agent import ControlFlowAgent
+from sub_agents.control_flow.agent import ControlFlowAgent, _buffered
+from tools.cad_tools import attempt_files_var
 
 # Define a subclass of Event that includes 'content' for autospec
 class EventWithContent(Event):
@@ -15,35 +19,72 @@ class TestControlFlowAgent(unittest.IsolatedAsyncioTestCase):
         self.session_service = MagicMock(spec=InMemorySessionService)
         self.memory_service = MagicMock(spec=InMemoryMemoryService)
         self.agent = ControlFlowAgent(self.session_service, self.memory_service)
+        # Keep the real sub-agents (and the RAG store they load) out of the tests
+        designer_patcher = patch("sub_agents.control_flow.agent.get_designer_agent", autospec=True)
+        coder_patcher = patch("sub_agents.control_flow.agent.get_coder_agent", autospec=True)
+        self.mock_get_designer = designer_patcher.start()
+        self.mock_get_coder = coder_patcher.start()
+        self.addCleanup(designer_patcher.stop)
+        self.addCleanup(coder_patcher.stop)
 
-    @patch('sub_agents.control_flow.agent.get_designer_agent', autospec=True)
-    @patch('sub_agents.control_flow.agent.get_coder_agent', autospec=True)
-    def test_init(self, mock_get_coder, mock_get_designer):
+    def test_init(self):
         """Test initialization of ControlFlowAgent."""
         agent = ControlFlowAgent(self.session_service, self.memory_service)
         self.assertEqual(agent.app_name, "forma-ai-service")
         self.assertEqual(agent.session_service, self.session_service)
         self.assertEqual(agent.memory_service, self.memory_service)
-        mock_get_designer.assert_called()
-        mock_get_coder.assert_called()
+        # Sub-agents are only built when first used, and only once
+        self.mock_get_designer.assert_not_called()
+        self.mock_get_coder.assert_not_called()
+        self.assertIs(agent.designer_agent, agent.designer_agent)
+        self.assertIs(agent.coder_agent, agent.coder_agent)
+        self.mock_get_designer.assert_called_once()
+        self.mock_get_coder.assert_called_once()
+
+    @patch('sub_agents.control_flow.agent.Runner', autospec=True)
+    def test_runners_are_reused(self, MockRunner):
+        """Test that each agent's Runner is built once and reused."""
+        self.agent.__dict__["designer_agent"] = MagicMock()
+        self.agent.__dict__["coder_agent"] = MagicMock()
+
+        self.assertIs(self.agent.designer_runner, self.agent.designer_runner)
+        self.assertIs(self.agent.coder_runner, self.agent.coder_runner)
+        self.assertEqual(MockRunner.call_count, 2)
+
+    async def test_warm_up_builds_runners(self):
+        """Test that warming up builds both sub-agent Runners."""
+        with patch('sub_agents.control_flow.agent.Runner', autospec=True) as MockRunner:
+            await self.agent._warm_up()
+
+        self.assertIn("designer_runner", self.agent.__dict__)
+        self.assertIn("coder_runner", self.agent.__dict__)
+        self.assertEqual(MockRunner.call_count, 2)
 
     async def test_ensure_session_exists(self):
         """Test _ensure_session when session already exists."""
-        self.session_service.get_session.return_value = MagicMock()
-        await self.agent._ensure_session("session_1", "user_1")
-        self.session_service.get_session.assert_called_with(
+        self.session_service.create_session.side_effect = AlreadyExistsError("exists")
+        created = await self.agent._ensure_session("session_1", "user_1")
+        self.assertFalse(created)
+        self.session_service.create_session.assert_called_with(
             app_name="forma-ai-service", user_id="user_1", session_id="session_1"
         )
-        self.session_service.create_session.assert_not_called()
 
     async def test_ensure_session_creates_new(self):
         """Test _ensure_session when session does not exist."""
-        self.session_service.get_session.return_value = None
-        await self.agent._ensure_session("session_1", "user_1")
+        created = await self.agent._ensure_session("session_1", "user_1")
+        self.assertTrue(created)
         self.session_service.create_session.assert_called_with(
             app_name="forma-ai-service", user_id="user_1", session_id="session_1"
         )
 
+    async def test_ensure_session_remembers_known_sessions(self):
+        """Test that a session seen before is not looked up again."""
+        await self.agent._ensure_session("session_1", "user_1")
+        created = await self.agent._ensure_session("session_1", "user_1")
+        self.assertFalse(created)
+        self.session_service.create_session.assert_called_once()
+        self.session_service.get_session.assert_not_called()
+
     def test_extract_or_generate_stl_success(self):
         """Test extraction of STL path from output."""
         output = "Here is the file: outputs/test.stl"
@@ -51,6 +92,32 @@ class TestControlFlowAgent(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(stl_path, "outputs/test.stl")
         self.assertIsNone(error)
 
+    def test_extract_or_generate_stl_sharded_path(self):
+        """Test extraction of an STL path inside an output shard directory."""
+        output = "Here is the file: outputs/ab/abcd_1234.stl"
+        stl_path, error = self.agent._extract_or_generate_stl(output)
+        self.assertEqual(stl_path, "outputs/ab/abcd_1234.stl")
+        self.assertIsNone(error)
+
+    def test_extract_or_generate_stl_streamed_path(self):
+        """Test that a path found while streaming is used without rescanning."""
+        stl_path, error = self.agent._extract_or_generate_stl("no path here", "outputs/ab/model.stl")
+        self.assertEqual(stl_path, "outputs/ab/model.stl")
+        self.assertIsNone(error)
+
+    async def test_scan_for_stl_keeps_first_match(self):
+        """Test that only the first STL path in the stream starts a render."""
+        with patch('sub_agents.control_flow.agent.render_stl_async', autospec=True) as mock_render:
+            mock_render.return_value = "image.png"
+            result_container = {}
+            self.agent._scan_for_stl("Thinking...", result_container)
+            self.agent._scan_for_stl("Saved outputs/ab/first.stl", result_container)
+            self.agent._scan_for_stl("Saved outputs/cd/second.stl", result_container)
+
+            self.assertEqual(result_container["stl"], "outputs/ab/first.stl")
+            self.assertEqual(await result_container["render_task"], "image.png")
+            mock_render.assert_called_once_with("outputs/ab/first.stl")
+
     @patch('sub_agents.control_flow.agent.create_cad_model', autospec=True)
     def test_extract_or_generate_stl_fallback_success(self, mock_create_cad):
         """Test fallback generation when no STL path is found but code block exists."""
@@ -138,9 +205,162 @@ class TestControlFlowAgent(unittest.IsolatedAsyncioTestCase):
             self.assertEqual(mock_loop.call_count, 3)
             self.assertIn("I'm sorry, I was unable to generate the model correctly after multiple attempts.\n", results)
 
+    async def test_run_speculative_attempt_wins(self):
+        """Test that a slow attempt gets a speculative twin and the first approval wins."""
+        self.agent._attempt_seconds = 0.01
+        slow_cancelled = asyncio.Event()
+
+        async def mock_loop_impl(current_spec, original_spec, user_id, session_id):
+            if "attempt variant" not in current_spec:
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    slow_cancelled.set()
+                    raise
+            yield "Here is your cube.\n"
+            yield (True, "")
+
+        with patch.object(self.agent, '_run_designer_step', autospec=True) as mock_designer, \
+             patch.object(self.agent, '_execute_loop_iteration', autospec=True) as mock_loop:
+            mock_designer.return_value = "Spec"
+            mock_loop.side_effect = mock_loop_impl
+            results = [item async for item in self.agent.run("a cube", "session_1", "user_1")]
+
+        self.assertIn("Here is your cube.\n", results)
+        self.assertEqual(mock_loop.call_count, 2)
+        self.assertEqual(mock_loop.call_args.args[3], "session_1~1")
+        self.assertTrue(slow_cancelled.is_set())
+        # The fork is deleted and its result is kept in the main session
+        self.session_service.delete_session.assert_awaited_once_with(
+            app_name="forma-ai-service", user_id="user_1", session_id="session_1~1")
+        self.assertNotIn(("user_1", "session_1~1"), self.agent._known_sessions)
+        events = [call.args[1] for call in self.session_service.append_event.await_args_list]
+        self.assertEqual([(event.author, event.content.parts[0].text) for event in events],
+                         [("user", "Spec\n\n(attempt variant 1)"), ("DesignerAgent", "Here is your cube.\n")])
+
+    async def test_run_speculative_attempt_keeps_feedback(self):
+        """Test that a twin of a slow retry codes the retry's spec rather than the original one."""
+        specs = []
+
+        async def mock_loop_impl(current_spec, original_spec, user_id, session_id):
+            specs.append(current_spec)
+            if len(specs) == 1:
+                yield (False, "Spec\n\nFeedback: the holes are missing")
+                return
+            if "attempt variant" not in current_spec:
+                # Only the retry is slow enough to get a twin
+                self.agent._attempt_seconds = 0.01
+                await asyncio.sleep(10)
+            yield (True, "")
+
+        with patch.object(self.agent, '_ensure_session', autospec=True) as mock_ensure, \
+             patch.object(self.agent, '_run_designer_step', autospec=True) as mock_designer, \
+             patch.object(self.agent, '_execute_loop_iteration', autospec=True) as mock_loop:
+            mock_ensure.return_value = False
+            mock_designer.return_value = "Spec"
+            mock_loop.side_effect = mock_loop_impl
+            [item async for item in self.agent.run("a cube", "session_1", "user_1")]
+
+        self.assertEqual(len(specs), 3)
+        self.assertEqual(specs[2], "Spec\n\nFeedback: the holes are missing\n\n(attempt variant 2)")
+
+    @patch('sub_agents.control_flow.agent.register_artifact')
+    @patch('sub_agents.control_flow.agent.task_id_var')
+    async def test_run_registers_only_winning_attempt_files(self, mock_task_id_var, mock_register):
+        """Test that files exported by a losing attempt never reach the task's artifacts."""
+        mock_task_id_var.get.return_value = "task_1"
+        self.agent._attempt_seconds = 0.01
+
+        async def mock_loop_impl(current_spec, original_spec, user_id, session_id):
+            if "attempt variant" not in current_spec:
+                attempt_files_var.get()["stl"] = "ta/task_1_slow.stl"
+                await asyncio.sleep(10)
+            attempt_files_var.get()["stl"] = "ta/task_1_fast.stl"
+            yield (True, "")
+
+        with patch.object(self.agent, '_ensure_session', autospec=True) as mock_ensure, \
+             patch.object(self.agent, '_run_designer_step', autospec=True) as mock_designer, \
+             patch.object(self.agent, '_execute_loop_iteration', autospec=True) as mock_loop:
+            mock_ensure.return_value = False
+            mock_designer.return_value = "Spec"
+            mock_loop.side_effect = mock_loop_impl
+            [item async for item in self.agent.run("a cube", "session_1", "user_1")]
+
+        mock_register.assert_called_once_with("task_1", "stl", "ta/task_1_fast.stl")
+
+    @patch('sub_agents.control_flow.agent.register_artifact')
+    @patch('sub_agents.control_flow.agent.task_id_var')
+    async def test_run_semantic_cache_hit(self, mock_task_id_var, mock_register):
+        """Test that a cached result is returned without running the agents and kept in the session."""
+        mock_task_id_var.get.return_value = "task_1"
+        session = MagicMock()
+        self.session_service.get_session.return_value = session
+        mock_cache = MagicMock()
+        mock_cache.lookup.return_value = {"response": "Here is your cube.", "files": {"stl": "ab/abc.stl"}}
+        self.agent.__dict__["semantic_cache"] = mock_cache
+
+        with patch.object(self.agent, '_ensure_session', autospec=True) as mock_ensure, \
+             patch.object(self.agent, '_run_designer_step', autospec=True) as mock_designer:
+            mock_ensure.return_value = True
+            results = [item async for item in self.agent.run("a cube", "session_1", "user_1")]
+
+        self.assertEqual(results, ["Here is your cube."])
+        mock_designer.assert_not_called()
+        mock_register.assert_called_once_with("task_1", "stl", "ab/abc.stl")
+        events = [call.args[1] for call in self.session_service.append_event.await_args_list]
+        self.assertTrue(all(call.args[0] is session for call in self.session_service.append_event.await_args_list))
+        self.assertEqual([(event.author, event.content.parts[0].text) for event in events],
+                         [("user", "a cube"), ("DesignerAgent", "Here is your cube.")])
+
+    @patch('sub_agents.control_flow.agent.get_artifacts')
+    @patch('sub_agents.control_flow.agent.task_id_var')
+    async def test_run_stores_approved_result(self, mock_task_id_var, mock_get_artifacts):
+        """Test that an approved result of a new session is cached."""
+        mock_task_id_var.get.return_value = "task_1"
+        mock_get_artifacts.return_value = {"stl": "ta/task_1_a.stl"}
+        mock_cache = MagicMock()
+        mock_cache.lookup.return_value = None
+        self.agent.__dict__["semantic_cache"] = mock_cache
+
+        async def mock_loop_impl(current_spec, original_spec, user_id, session_id):
+            yield "Here is your cube.\n"
+            yield (True, "")
+
+        with patch.object(self.agent, '_ensure_session', autospec=True) as mock_ensure, \
+             patch.object(self.agent, '_run_designer_step', autospec=True) as mock_designer, \
+             patch.object(self.agent, '_execute_loop_iteration', autospec=True) as mock_loop:
+            mock_ensure.return_value = True
+            mock_designer.return_value = "Spec"
+            mock_loop.side_effect = mock_loop_impl
+            [item async for item in self.agent.run("a cube", "session_1", "user_1")]
+
+        mock_cache.store.assert_called_once_with("a cube", "Here is your cube.\n", {"stl": "ta/task_1_a.stl"})
+
+    async def test_get_designer_feedback_sends_image(self):
+        """Test that the rendered image is read and sent to the Designer."""
+        self.agent.__dict__["designer_agent"] = MagicMock()
+        with tempfile.NamedTemporaryFile(suffix=".png") as png, \
+             patch('sub_agents.control_flow.agent.Runner', autospec=True) as MockRunner:
+            png.write(b"png-bytes")
+            png.flush()
+
+            mock_event = create_autospec(EventWithContent, instance=True)
+            mock_event.content = Content(parts=[Part(text="APPROVED")], role="model")
+            mock_event.is_final_response.return_value = True
+
+            async def mock_run_async(*args, **kwargs):
+                yield mock_event
+            MockRunner.return_value.run_async.side_effect = mock_run_async
+
+            feedback = await self.agent._get_designer_feedback(png.name, "spec", "user", "session")
+
+        self.assertEqual(feedback, "APPROVED")
+        sent = MockRunner.return_value.run_async.call_args.kwargs["new_message"]
+        self.assertEqual(sent.parts[1].inline_data.data, b"png-bytes")
+
     async def test_verify_model_approved(self):
         """Test _verify_model when designer approves."""
-        with patch('sub_agents.control_flow.agent.render_stl', autospec=True) as mock_render, \
+        with patch('sub_agents.control_flow.agent.render_stl_async', autospec=True) as mock_render, \
              patch.object(self.agent, '_get_designer_feedback', autospec=True) as mock_feedback:
             
             mock_render.return_value = "path/to/image.png"
@@ -154,7 +374,7 @@ class TestControlFlowAgent(unittest.IsolatedAsyncioTestCase):
 
     async def test_verify_model_rejected(self):
         """Test _verify_model when designer rejects."""
-        with patch('sub_agents.control_flow.agent.render_stl', autospec=True) as mock_render, \
+        with patch('sub_agents.control_flow.agent.render_stl_async', autospec=True) as mock_render, \
              patch.object(self.agent, '_get_designer_feedback', autospec=True) as mock_feedback:
             
             mock_render.return_value = "path/to/image.png"
@@ -165,6 +385,82 @@ class TestControlFlowAgent(unittest.IsolatedAsyncioTestCase):
             self.assertFalse(is_approved)
             self.assertEqual(feedback, "The model is too small.")
 
+    async def test_verify_model_reuses_early_render(self):
+        """Test _verify_model awaits a render started during the coder step."""
+        async def early_render():
+            return "early.png"
+
+        with patch('sub_agents.control_flow.agent.render_stl_async', autospec=True) as mock_render, \
+             patch.object(self.agent, '_get_designer_feedback', autospec=True) as mock_feedback:
+
+            mock_feedback.return_value = "APPROVED"
+            render_task = asyncio.create_task(early_render())
+
+            is_approved, _, png_path = await self.agent._verify_model("model.stl", "spec", "user", "session", render_task)
+
+            self.assertTrue(is_approved)
+            self.assertEqual(png_path, "early.png")
+            mock_render.assert_not_called()
+
+    async def test_execute_loop_iteration_cancels_stale_render(self):
+        """Test an early render of a different STL is cancelled and not reused."""
+        with patch.object(self.agent, '_run_coder_step', autospec=True) as mock_run_coder, \
+             patch.object(self.agent, '_extract_or_generate_stl', autospec=True) as mock_extract, \
+             patch.object(self.agent, '_verify_model', autospec=True) as mock_verify:
+
+            render_task = asyncio.create_task(asyncio.sleep(10))
+
+            async def mock_run_coder_impl(spec, user_id, session_id, result_container):
+                yield "Generating..."
+                result_container["output"] = "Code"
+                result_container["stl"] = "outputs/ol/old.stl"
+                result_container["render_task"] = render_task
+            mock_run_coder.side_effect = mock_run_coder_impl
+            mock_extract.return_value = ("outputs/ne/new.stl", None)
+            mock_verify.return_value = (True, "APPROVED", "image.png")
+
+            [item async for item in self.agent._execute_loop_iteration("spec", "orig_spec", "user", "session")]
+
+            await asyncio.sleep(0)
+            self.assertTrue(render_task.cancelled())
+            mock_verify.assert_called_once_with("outputs/ne/new.stl", "orig_spec", "user", "session", None)
+
+    async def test_buffered_runs_ahead_of_consumer(self):
+        """Test that _buffered drains the generator before the consumer asks for items."""
+        produced = []
+
+        async def gen():
+            for i in range(3):
+                produced.append(i)
+                yield i
+
+        iterator = _buffered(gen(), size=8)
+        self.assertEqual(await anext(iterator), 0)
+        await asyncio.sleep(0)
+        self.assertEqual(produced, [0, 1, 2])
+        self.assertEqual([item async for item in iterator], [1, 2])
+
+    async def test_buffered_reraises_errors(self):
+        """Test that an error in the buffered generator reaches the consumer."""
+        async def gen():
+            yield 1
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            [item async for item in _buffered(gen())]
+
+    async def test_verify_model_requires_leading_marker(self):
+        """Test that feedback only mentioning APPROVED later on is a rejection."""
+        with patch('sub_agents.control_flow.agent.render_stl_async', autospec=True) as mock_render, \
+             patch.object(self.agent, '_get_designer_feedback', autospec=True) as mock_feedback:
+
+            mock_render.return_value = "path/to/image.png"
+            mock_feedback.return_value = "This cannot be APPROVED yet, the hole is missing."
+
+            is_approved, _, _ = await self.agent._verify_model("model.stl", "spec", "user", "session")
+
+            self.assertFalse(is_approved)
+
     async def test_execute_loop_iteration_rejection_retry(self):
         """Test loop iteration when model is rejected by designer."""
         with patch.object(self.agent, '_run_coder_step', autospec=True) as mock_run_coder, \
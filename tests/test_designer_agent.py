@@ -0,0 +1,45 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, AsyncMock
+from sub_agents.designer.agent import _make_batch_lookup
+
+class TestBatchLookup(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.search_tool = MagicMock()
+        self.rag_tool = MagicMock()
+        self.batch_lookup = _make_batch_lookup(self.search_tool, self.rag_tool)
+
+    async def test_runs_lookups_concurrently(self):
+        """Test that the lookups overlap instead of running one after another."""
+        running = 0
+        peak = 0
+
+        async def slow_search(query):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return f"result for {query}"
+
+        self.search_tool.web_search = AsyncMock(side_effect=slow_search)
+        self.search_tool.image_search = AsyncMock(side_effect=slow_search)
+        self.rag_tool.query.return_value = "docs"
+
+        result = await self.batch_lookup(web="lego brick", image="lego", doc="box example")
+
+        self.assertEqual(result, {"web": "result for lego brick", "image": "result for lego", "doc": "docs"})
+        self.assertEqual(peak, 2)
+
+    async def test_skips_empty_queries_and_reports_errors(self):
+        """Test that empty queries are skipped and a failing lookup does not fail the others."""
+        self.search_tool.web_search = AsyncMock(side_effect=RuntimeError("offline"))
+        self.rag_tool.query.return_value = "docs"
+
+        result = await self.batch_lookup(web="gear", doc="gear example")
+
+        self.assertEqual(result, {"web": "Lookup failed: offline", "doc": "docs"})
+        self.search_tool.image_search.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
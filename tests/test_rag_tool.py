@@ -0,0 +1,118 @@
+import unittest
+from unittest.mock import AsyncMock, patch
+from tools.rag_tool import RAGTool
+
+class TestProcessPageContent(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        with patch('tools.rag_tool.chromadb'), \
+             patch('tools.rag_tool.embedding_functions'):
+            self.rag = RAGTool()
+
+    async def test_extracts_main_content_and_code(self):
+        """Test that only the main content is kept and code blocks keep their lines."""
+        html = (
+            "<html><body><nav>Site menu</nav>"
+            "<div role='main'><h1>Boxes</h1><p>Make a <b>box</b>:</p><nav>On this page</nav>"
+            "<pre><span>b = Box(1, 1, 1)</span><br><span>show(b)</span></pre><!-- hidden --><script>track()</script>"
+            "</div><footer>Copyright</footer></body></html>"
+        )
+
+        text = await self.rag._process_page_content(html)
+
+        self.assertEqual(text, "Boxes\nMake a \nbox\n:\n\n```python\nb = Box(1, 1, 1)\nshow(b)\n```\n")
+
+    async def test_falls_back_to_article_or_body(self):
+        """Test that pages without a main div use the article, then the body."""
+        self.assertEqual(await self.rag._process_page_content("<body><p>x</p><article>doc</article></body>"), "doc")
+        self.assertEqual(await self.rag._process_page_content("<body><p>page</p></body>"), "page")
+        self.assertIsNone(await self.rag._process_page_content(""))
+
+class TestIngestDocs(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        with patch('tools.rag_tool.chromadb'), \
+             patch('tools.rag_tool.embedding_functions'):
+            self.rag = RAGTool()
+
+    async def test_changed_corpus_recreates_collection(self):
+        """Test that a rebuild starts from a new collection, which may have another embedding dimension."""
+        old_collection = self.rag.collection
+        old_collection.count.return_value = 10
+        new_collection = self.rag.client.get_or_create_collection.return_value = object()
+
+        with patch.object(self.rag, '_read_fingerprint', return_value="stale"), \
+             patch.object(self.rag, '_ingest', new_callable=AsyncMock) as mock_ingest:
+            await self.rag.ingest_docs()
+
+        self.rag.client.delete_collection.assert_called_once_with("build123d_docs")
+        self.assertIs(self.rag.collection, new_collection)
+        mock_ingest.assert_awaited_once_with(self.rag._fingerprint())
+
+class TestChunkText(unittest.TestCase):
+    def setUp(self):
+        with patch('tools.rag_tool.chromadb'), \
+             patch('tools.rag_tool.embedding_functions'):
+            self.rag = RAGTool()
+
+    def test_sliding_windows_cover_text(self):
+        """Test that text is cut into fixed-size overlapping windows ending with the text."""
+        text = "".join(chr(ord("a") + i % 26) for i in range(3375))
+
+        chunks = self.rag._chunk_text(text, chunk_size=1500, stride=1125)
+
+        self.assertEqual(chunks, [text[0:1500], text[1125:2625], text[1875:3375]])
+
+    def test_no_duplicate_final_window(self):
+        """Test that a text ending exactly on a stride gets no repeated last chunk."""
+        chunks = self.rag._chunk_text("x" * 2625, chunk_size=1500, stride=1125)
+        self.assertEqual(len(chunks), 2)
+
+    def test_short_text_is_one_chunk(self):
+        """Test that text no longer than a chunk is kept whole."""
+        self.assertEqual(self.rag._chunk_text("short"), ["short"])
+
+class TestWarmUp(unittest.TestCase):
+    def setUp(self):
+        with patch('tools.rag_tool.chromadb'), \
+             patch('tools.rag_tool.embedding_functions'):
+            self.rag = RAGTool()
+
+    def test_warm_up_queries_collection(self):
+        """Test that warming up runs one query against the collection."""
+        self.rag.warm_up()
+        self.rag.collection.query.assert_called_once_with(query_texts=["build123d"], n_results=1)
+
+    def test_warm_up_failure_is_not_raised(self):
+        """Test that a failed warm-up does not stop startup."""
+        self.rag.collection.query.side_effect = RuntimeError("index missing")
+        self.rag.warm_up()
+
+class TestQuery(unittest.TestCase):
+    def setUp(self):
+        with patch('tools.rag_tool.chromadb'), \
+             patch('tools.rag_tool.embedding_functions'):
+            self.rag = RAGTool()
+        self.rag.collection.query.return_value = {
+            "documents": [["Box docs", "Cylinder docs"]], "metadatas": [[{}, {}]]
+        }
+
+    def test_repeated_query_is_cached(self):
+        """Test that asking the same question again does not query the collection."""
+        first = self.rag.query("how to make a box")
+        second = self.rag.query("how to make a box")
+
+        self.assertEqual(first, "Box docs\n\nCylinder docs")
+        self.assertEqual(second, first)
+        self.rag.collection.query.assert_called_once()
+
+        self.rag.query("how to make a box", n_results=3)
+        self.assertEqual(self.rag.collection.query.call_count, 2)
+
+    def test_failed_query_is_not_cached(self):
+        """Test that an error is retried on the next call."""
+        self.rag.collection.query.side_effect = [RuntimeError("busy"), self.rag.collection.query.return_value]
+
+        self.assertIn("RAG Query failed", self.rag.query("fillet"))
+        self.assertEqual(self.rag.query("fillet"), "Box docs\n\nCylinder docs")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import os
+import tempfile
+from tools import renderer
+
+def _no_time_limit(seconds, func, *args):
+    # The default executor runs jobs in threads, where SIGALRM cannot be installed
+    return func(*args)
+
+class TestRenderer(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        renderer._render_cache.clear()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def _write(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    @patch('tools.renderer._get_executor', return_value=None)
+    @patch('tools.renderer.call_with_time_limit', side_effect=_no_time_limit)
+    @patch('tools.renderer.render_stl')
+    async def test_render_reused_for_identical_stl(self, mock_render, mock_call, mock_executor):
+        """Test that an STL with the same contents reuses the earlier render."""
+        first = self._write("a.stl", b"solid cube")
+        second = self._write("b.stl", b"solid cube")
+        png = self._write("a.png", b"png")
+        mock_render.return_value = png
+
+        self.assertEqual(await renderer.render_stl_async(first), png)
+        self.assertEqual(await renderer.render_stl_async(second), png)
+        mock_render.assert_called_once_with(first, None)
+
+    @patch('tools.renderer._get_executor', return_value=None)
+    @patch('tools.renderer.call_with_time_limit', side_effect=_no_time_limit)
+    @patch('tools.renderer.render_stl')
+    async def test_render_repeated_for_different_stl(self, mock_render, mock_call, mock_executor):
+        """Test that an STL with different contents is rendered again."""
+        first = self._write("a.stl", b"solid cube")
+        second = self._write("b.stl", b"solid sphere")
+        mock_render.side_effect = [self._write("a.png", b"png"), self._write("b.png", b"png")]
+
+        await renderer.render_stl_async(first)
+        self.assertEqual(await renderer.render_stl_async(second), os.path.join(self.tmpdir.name, "b.png"))
+        self.assertEqual(mock_render.call_count, 2)
+
+    @patch('tools.renderer._get_executor', return_value=None)
+    @patch('tools.renderer.call_with_time_limit', side_effect=renderer.JobTimeout)
+    async def test_render_timeout_returns_none(self, mock_call, mock_executor):
+        """Test that a render interrupted by its time limit is reported as failed."""
+        stl_path = self._write("a.stl", b"solid cube")
+
+        self.assertIsNone(await renderer.render_stl_async(stl_path))
+        mock_call.assert_called_once_with(renderer.RENDER_TIME_LIMIT, renderer.render_stl, stl_path, None)
+        self.assertEqual(len(renderer._render_cache), 0)
+
+    def test_render_stl_writes_small_jpeg(self):
+        """Test that the preview is a small JPEG next to the STL."""
+        import numpy as np
+        mock_pv = MagicMock()
+        mock_pv.Plotter.return_value.screenshot.return_value = np.zeros((8, 8, 3), dtype=np.uint8)
+        stl_path = self._write("model.stl", b"solid cube")
+
+        with patch.dict('sys.modules', {'pyvista': mock_pv}):
+            image_path = renderer.render_stl(stl_path)
+
+        self.assertEqual(image_path, os.path.join(self.tmpdir.name, "model.jpg"))
+        with open(image_path, "rb") as f:
+            self.assertEqual(f.read(3), b"\xff\xd8\xff")
+        mock_pv.Plotter.assert_called_once_with(off_screen=True, window_size=list(renderer.PREVIEW_SIZE))
+
+    def test_setup_headless_uses_egl_without_display(self):
+        """Test that without a display VTK renders through EGL instead of an X server."""
+        mock_pv = MagicMock()
+        renderer.setup_headless.cache_clear()
+        self.addCleanup(renderer.setup_headless.cache_clear)
+
+        with patch.dict('sys.modules', {'pyvista': mock_pv}), \
+             patch.dict('os.environ', clear=True):
+            renderer.setup_headless()
+            self.assertEqual(os.environ["VTK_DEFAULT_OPENGL_WINDOW"], "vtkEGLRenderWindow")
+
+        self.assertTrue(mock_pv.OFF_SCREEN)
+        mock_pv.start_xvfb.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+from tools.search_tools import SearchTools, _MIN_STATIC_TEXT
+
+def _response(html, content_type="text/html; charset=utf-8"):
+    response = MagicMock(text=html, headers={"content-type": content_type})
+    response.raise_for_status = MagicMock()
+    return response
+
+class TestFetchPage(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        with patch('tools.search_tools.DDGS'):
+            self.tools = SearchTools()
+        self.client = MagicMock(get=AsyncMock())
+        self.pool = MagicMock()
+        patcher_client = patch('tools.search_tools.http_pool.get_client', return_value=self.client)
+        patcher_pool = patch('tools.search_tools.browser_pool.get_pool', return_value=self.pool)
+        patcher_client.start()
+        patcher_pool.start()
+        self.addCleanup(patcher_client.stop)
+        self.addCleanup(patcher_pool.stop)
+
+    def _browser_returns(self, html):
+        page = MagicMock(goto=AsyncMock(), content=AsyncMock(return_value=html))
+        self.pool.page.return_value.__aenter__ = AsyncMock(return_value=page)
+        self.pool.page.return_value.__aexit__ = AsyncMock(return_value=False)
+
+    async def test_static_page_skips_browser(self):
+        """Test that a page with enough text in its HTML is not rendered."""
+        body = "Bearing 608ZZ: 8 mm bore, 22 mm outer diameter. " * 20
+        self.client.get.return_value = _response(f"<html><nav>Menu</nav><p>{body}</p><script>x()</script></html>")
+
+        text = await self.tools.fetch_page("https://example.com/608zz")
+
+        self.assertEqual(text, body.strip())
+        self.pool.page.assert_not_called()
+
+    async def test_script_page_falls_back_to_browser(self):
+        """Test that a page whose HTML is mostly empty is rendered in the browser."""
+        self.client.get.return_value = _response("<html><div id='app'></div><script>render()</script></html>")
+        self._browser_returns("<html><p>Rendered datasheet</p></html>")
+
+        text = await self.tools.fetch_page("https://example.com/app")
+
+        self.assertEqual(text, "Rendered datasheet")
+        self.pool.page.assert_called_once()
+
+    async def test_non_html_falls_back_to_browser(self):
+        """Test that responses other than HTML are left to the browser."""
+        self.client.get.return_value = _response("x" * (2 * _MIN_STATIC_TEXT), content_type="application/pdf")
+        self._browser_returns("<html><p>Viewer</p></html>")
+
+        self.assertEqual(await self.tools.fetch_page("https://example.com/a.pdf"), "Viewer")
+
+    async def test_failed_request_falls_back_to_browser(self):
+        """Test that a blocked or failed plain request still gets the page through the browser."""
+        self.client.get.side_effect = RuntimeError("403 Forbidden")
+        self._browser_returns("<html><p>Hello</p></html>")
+
+        self.assertEqual(await self.tools.fetch_page("https://example.com"), "Hello")
+
+if __name__ == '__main__':
+    unittest.main()
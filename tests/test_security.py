@@ -1,5 +1,5 @@
 import unittest
-from tools.security import validate_code, SecurityViolation
+from tools.security import validate_code, CodeValidator, SecurityViolation
 
 class TestSecurityValidator(unittest.TestCase):
     def test_valid_code(self):
@@ -18,6 +18,11 @@ result = create_cube()
         except SecurityViolation:
             self.fail("validate_code raised SecurityViolation unexpectedly!")
 
+    def test_returns_compiled_code(self):
+        scope = {}
+        exec(validate_code("result = 2 * 3"), {}, scope)
+        self.assertEqual(scope["result"], 6)
+
     def test_invalid_import(self):
         code = "import os"
         with self.assertRaises(SecurityViolation):
@@ -53,5 +58,18 @@ result = create_cube()
         with self.assertRaises(SecurityViolation):
             validate_code(code)
 
+    def test_nested_violations_reported(self):
+        code = "def g():\n    global q\n    return open('x')\n"
+        with self.assertRaises(SecurityViolation) as ctx:
+            validate_code(code)
+        self.assertIn("Global statement is not allowed.", str(ctx.exception))
+        self.assertIn("Calling function 'open' is not allowed.", str(ctx.exception))
+
+    def test_many_violations_stop_early(self):
+        code = "\n".join(f"open('f{i}')" for i in range(1000))
+        with self.assertRaises(SecurityViolation) as ctx:
+            validate_code(code)
+        self.assertEqual(len(str(ctx.exception).splitlines()), CodeValidator.MAX_ERRORS)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+from unittest.mock import patch
+from tools.semantic_cache import SemanticCache
+
+class TestSemanticCache(unittest.TestCase):
+    def setUp(self):
+        with patch('tools.semantic_cache.get_rag_tool'):
+            self.cache = SemanticCache(threshold=0.9, ttl=60)
+        self.collection = self.cache.collection
+        self.collection.count.return_value = 1
+
+    def _query_result(self, distance):
+        return {
+            "ids": [["entry_1"]],
+            "distances": [[distance]],
+            "metadatas": [[{"response": "Here is your cube.", "files": '{"stl": "ab/abc.stl"}', "ts": 0}]],
+        }
+
+    @patch('tools.semantic_cache.os.path.exists', return_value=True)
+    def test_lookup_hit(self, mock_exists):
+        """Test that a similar prompt returns the cached result."""
+        self.collection.query.return_value = self._query_result(0.05)
+
+        result = self.cache.lookup("a cube")
+
+        self.assertEqual(result, {"response": "Here is your cube.", "files": {"stl": "ab/abc.stl"}})
+
+    def test_lookup_requires_same_numbers(self):
+        """Test that only entries with the same numbers and units are candidates."""
+        self.collection.query.return_value = {"ids": [[]], "distances": [[]], "metadatas": [[]]}
+
+        self.assertIsNone(self.cache.lookup("A  20 mm cube with 4 holes"))
+
+        kwargs = self.collection.query.call_args.kwargs
+        self.assertEqual(kwargs["query_texts"], ["a 20 mm cube with 4 holes"])
+        self.assertIn({"numbers": "20mm 4"}, kwargs["where"]["$and"])
+
+    @patch('tools.semantic_cache.os.path.exists', return_value=True)
+    def test_lookup_below_threshold(self, mock_exists):
+        """Test that a dissimilar prompt is a miss."""
+        self.collection.query.return_value = self._query_result(0.3)
+        self.assertIsNone(self.cache.lookup("a sphere"))
+
+    @patch('tools.semantic_cache.os.path.exists', return_value=False)
+    def test_lookup_missing_files(self, mock_exists):
+        """Test that a result whose files were deleted is a miss."""
+        self.collection.query.return_value = self._query_result(0.05)
+        self.assertIsNone(self.cache.lookup("a cube"))
+
+    def test_lookup_empty(self):
+        """Test that an empty cache is not queried."""
+        self.collection.count.return_value = 0
+        self.assertIsNone(self.cache.lookup("a cube"))
+        self.collection.query.assert_not_called()
+
+    def test_store(self):
+        """Test that results are stored with their metadata and expired entries are pruned."""
+        self.cache.store("A 10mm Cube", "Here is your cube.", {"stl": "ab/abc.stl"})
+
+        kwargs = self.collection.add.call_args.kwargs
+        self.assertEqual(kwargs["documents"], ["a 10mm cube"])
+        self.assertEqual(kwargs["metadatas"][0]["numbers"], "10mm")
+        self.assertEqual(kwargs["metadatas"][0]["response"], "Here is your cube.")
+        self.collection.delete.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+from a2a.task_manager import TaskManager
+from a2a.redis_task_manager import RedisTaskManager
+from a2a.models import Task, TaskState, Message, Role, Part
+
+class TestTaskManager(unittest.IsolatedAsyncioTestCase):
+    async def test_create_and_get_task(self):
+        """Test that a created task can be retrieved."""
+        manager = TaskManager()
+        task = await manager.create_task(context_id="ctx_1")
+
+        self.assertEqual(await manager.get_task(task.id), task)
+        self.assertEqual(task.context_id, "ctx_1")
+        self.assertIs(task.status.state, TaskState.SUBMITTED)
+        self.assertIsNotNone(task.status.timestamp.tzinfo)
+        self.assertIn("timestamp", task.model_dump(by_alias=True)["status"])
+        # Internally built tasks must still pass validation at the API boundary
+        self.assertEqual(Task.model_validate(task.model_dump(by_alias=True)).id, task.id)
+
+    async def test_lru_eviction(self):
+        """Test that the least recently used task is evicted when full."""
+        manager = TaskManager(max_tasks=2)
+        first = await manager.create_task()
+        second = await manager.create_task()
+
+        # Touch the first task so the second becomes the eviction candidate
+        await manager.get_task(first.id)
+        third = await manager.create_task()
+
+        self.assertIsNotNone(await manager.get_task(first.id))
+        self.assertIsNone(await manager.get_task(second.id))
+        self.assertIsNotNone(await manager.get_task(third.id))
+
+    async def test_update_task_status(self):
+        """Test updating a task's state and history."""
+        manager = TaskManager()
+        task = await manager.create_task()
+        message = Message(role=Role.AGENT, parts=[Part(text="done")])
+
+        await manager.update_task_status(task.id, TaskState.WORKING)
+        await manager.flush()
+        self.assertEqual((await manager.get_task(task.id)).status.state, TaskState.WORKING)
+
+        await manager.update_task_status(task.id, TaskState.COMPLETED, message)
+        updated = await manager.get_task(task.id)
+        self.assertEqual(updated.status.state, TaskState.COMPLETED)
+        self.assertEqual(updated.history, [message])
+
+    async def test_history_is_capped(self):
+        """Test that only the most recent messages are kept in the history."""
+        manager = TaskManager(max_history=2, coalesce_window=0)
+        task = await manager.create_task()
+        messages = [Message(role=Role.AGENT, parts=[Part(text=str(i))]) for i in range(3)]
+
+        for message in messages:
+            await manager.update_task_status(task.id, TaskState.WORKING, message)
+
+        self.assertEqual((await manager.get_task(task.id)).history, messages[1:])
+
+    async def test_working_updates_are_coalesced(self):
+        """Test that only the latest progress update in the window is written."""
+        manager = TaskManager(coalesce_window=0.01)
+        task = await manager.create_task()
+        first = Message(role=Role.AGENT, parts=[Part(text="step 1")])
+        second = Message(role=Role.AGENT, parts=[Part(text="step 2")])
+
+        await manager.update_task_status(task.id, TaskState.WORKING, first)
+        await manager.update_task_status(task.id, TaskState.WORKING, second)
+        self.assertEqual((await manager.get_task(task.id)).status.state, TaskState.SUBMITTED)
+
+        await asyncio.sleep(0.05)
+        updated = await manager.get_task(task.id)
+        self.assertEqual(updated.status.state, TaskState.WORKING)
+        self.assertEqual(updated.history, [second])
+
+    async def test_terminal_update_is_immediate(self):
+        """Test that a terminal update is applied at once after the pending progress message."""
+        manager = TaskManager(coalesce_window=10)
+        task = await manager.create_task()
+        progress = Message(role=Role.AGENT, parts=[Part(text="working")])
+        done = Message(role=Role.AGENT, parts=[Part(text="done")])
+
+        await manager.update_task_status(task.id, TaskState.WORKING, progress)
+        await manager.update_task_status(task.id, TaskState.COMPLETED, done)
+
+        updated = await manager.get_task(task.id)
+        self.assertEqual(updated.status.state, TaskState.COMPLETED)
+        self.assertEqual(updated.history, [progress, done])
+
+    async def test_finished_task_stays_finished(self):
+        """Test that a progress update flushed after the task finished does not reopen it."""
+        manager = TaskManager(coalesce_window=0)
+        task = await manager.create_task()
+        done = Message(role=Role.AGENT, parts=[Part(text="done")])
+
+        await manager.update_task_status(task.id, TaskState.COMPLETED, done)
+        await manager._apply_status(task.id, TaskState.WORKING, Message(role=Role.AGENT, parts=[Part(text="late")]))
+
+        updated = await manager.get_task(task.id)
+        self.assertEqual(updated.status.state, TaskState.COMPLETED)
+        self.assertEqual(updated.history, [done])
+
+    async def test_redis_finished_task_stays_finished(self):
+        """Test that Redis skips a progress write for a task that already finished."""
+        manager = RedisTaskManager("redis://localhost:6379/0")
+        manager._redis = MagicMock(hget=AsyncMock(return_value=TaskState.COMPLETED.value))
+
+        await manager._apply_status("task_1", TaskState.WORKING)
+
+        manager._redis.pipeline.assert_not_called()
+
+    async def test_finished_task_expires(self):
+        """Test that tasks in a terminal state are dropped after the TTL."""
+        manager = TaskManager(finished_ttl=0.01)
+        task = await manager.create_task()
+
+        await manager.update_task_status(task.id, TaskState.FAILED)
+        self.assertIsNotNone(await manager.get_task(task.id))
+
+        await asyncio.sleep(0.05)
+        self.assertIsNone(await manager.get_task(task.id))
+
+    async def test_wait_for_update(self):
+        """Test that waiters are woken by a status update and time out otherwise."""
+        manager = TaskManager()
+        task = await manager.create_task()
+
+        self.assertFalse(await manager.wait_for_update(task.id, timeout=0.01))
+
+        waiter = asyncio.create_task(manager.wait_for_update(task.id, timeout=1))
+        await asyncio.sleep(0)
+        await manager.update_task_status(task.id, TaskState.WORKING)
+        self.assertTrue(await waiter)
+
+if __name__ == '__main__':
+    unittest.main()
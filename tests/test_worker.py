@@ -0,0 +1,47 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+from a2a import worker
+
+class TestWorker(unittest.IsolatedAsyncioTestCase):
+    async def test_submit_bounds_concurrency(self):
+        """Test that submitted tasks never exceed the concurrency limit."""
+        running = 0
+        peak = 0
+
+        async def job():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        with patch.object(worker, '_semaphore', asyncio.Semaphore(2)):
+            for _ in range(5):
+                await worker.submit(job())
+            await worker.shutdown()
+
+        self.assertEqual(peak, 2)
+        self.assertEqual(len(worker._tasks), 0)
+
+    async def test_shutdown_cancels_tasks_after_timeout(self):
+        """Test that running and queued tasks are cancelled after the timeout and still clean up."""
+        cleaned_up = []
+
+        async def job(name):
+            try:
+                await asyncio.sleep(10)
+            finally:
+                cleaned_up.append(name)
+
+        with patch.object(worker, '_semaphore', asyncio.Semaphore(1)):
+            await worker.submit(job("running"))
+            await worker.submit(job("queued"))
+            await asyncio.sleep(0)
+            await worker.shutdown(timeout=0.01)
+
+        self.assertCountEqual(cleaned_up, ["running", "queued"])
+        self.assertEqual(len(worker._tasks), 0)
+
+if __name__ == '__main__':
+    unittest.main()
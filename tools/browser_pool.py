@@ -0,0 +1,160 @@
+"""Shared headless browser.
+
+This module provides a process-wide Chromium instance with a fixed set of
+browser contexts, so pages scraped by the tools do not each pay for launching
+a new browser.
+"""
+
+import asyncio
+import contextlib
+import logging
+from typing import AsyncIterator, Optional
+from playwright.async_api import async_playwright, Browser, BrowserContext, Page, Playwright, Route
+
+logger = logging.getLogger(__name__)
+
+# Number of browser contexts, and so of pages open at the same time
+POOL_SIZE = 4
+_LAUNCH_ARGS = ['--no-sandbox', '--disable-setuid-sandbox']
+# Desktop Chrome user agent, also sent by plain HTTP fetches of the same pages
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+)
+# Only the text of pages is read, so these are never downloaded
+_BLOCKED_RESOURCE_TYPES = frozenset({"image", "stylesheet", "font", "media"})
+
+async def _skip_heavy_resources(route: Route) -> None:
+    """Aborts requests for resources that do not affect page text."""
+    if route.request.resource_type in _BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+class BrowserPool:
+    """Lends out pages from a single long-lived Chromium browser.
+
+    The browser is launched on first use and relaunched if it disconnects.
+    Each page gets a context of its own, which is returned to the pool when
+    the page is released. A semaphore bounds the pages lent out, so waiters
+    are not tied to the contexts of a browser that may be replaced meanwhile.
+    """
+    def __init__(self, size: int = POOL_SIZE):
+        """Initialize an empty pool.
+
+        Args:
+            size (int): Number of browser contexts to create.
+        """
+        self._size = size
+        self._pw: Optional[Playwright] = None
+        self._browser: Optional[Browser] = None
+        self._contexts: list[BrowserContext] = []
+        self._slots = asyncio.Semaphore(size)
+        self._lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        """Launches the browser and its contexts unless it is already running."""
+        async with self._lock:
+            if self._browser is not None and self._browser.is_connected():
+                return
+            await self._close()
+            logger.info("Launching browser...")
+            self._pw = await async_playwright().start()
+            self._browser = await self._pw.chromium.launch(headless=True, args=_LAUNCH_ARGS)
+            contexts = []
+            for _ in range(self._size):
+                context = await self._browser.new_context(user_agent=USER_AGENT)
+                await context.route("**/*", _skip_heavy_resources)
+                contexts.append(context)
+            self._contexts = contexts
+
+    async def acquire(self) -> Page:
+        """Opens a page, waiting for a free slot if all are in use.
+
+        Returns:
+            Page: A new page; pass it to release() when done.
+        """
+        await self._slots.acquire()
+        try:
+            await self.start()
+            # Taken only after the slot, so a context of the current browser is always free
+            context = self._contexts.pop()
+            try:
+                return await context.new_page()
+            except Exception:
+                self._return_context(context)
+                raise
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def release(self, page: Page) -> None:
+        """Closes a page and returns its context to the pool.
+
+        Args:
+            page (Page): A page returned by acquire().
+        """
+        context = page.context
+        try:
+            await page.close()
+            await context.clear_cookies()
+        except Exception as e:
+            logger.warning("Failed to clean up page: %s", e)
+        finally:
+            self._return_context(context)
+            self._slots.release()
+
+    def _return_context(self, context: BrowserContext) -> None:
+        """Makes a context available again, unless its browser has since been relaunched."""
+        if context.browser is self._browser:
+            self._contexts.append(context)
+
+    @contextlib.asynccontextmanager
+    async def page(self) -> AsyncIterator[Page]:
+        """Lends out a page for the duration of a with block.
+
+        Yields:
+            Page: A new page.
+        """
+        page = await self.acquire()
+        try:
+            yield page
+        finally:
+            await self.release(page)
+
+    async def _close(self) -> None:
+        """Closes the browser and stops Playwright, if they were started."""
+        if self._browser is not None:
+            with contextlib.suppress(Exception):
+                await self._browser.close()
+            self._browser = None
+        if self._pw is not None:
+            with contextlib.suppress(Exception):
+                await self._pw.stop()
+            self._pw = None
+        self._contexts = []
+
+    async def close(self) -> None:
+        """Closes the browser."""
+        async with self._lock:
+            await self._close()
+
+_pool: Optional[BrowserPool] = None
+
+def get_pool() -> BrowserPool:
+    """Returns the shared browser pool, creating it on first use.
+
+    Returns:
+        BrowserPool: The shared pool.
+    """
+    global _pool
+    if _pool is None:
+        _pool = BrowserPool()
+    return _pool
+
+async def aclose() -> None:
+    """Closes the shared browser if it was launched."""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
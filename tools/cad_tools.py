@@ -5,25 +5,274 @@ and render the resulting STL files to images.
 """
 
 import os
+import json
+import asyncio
+import time
 import uuid
+import shutil
+import functools
+import hashlib
 import logging
 import contextvars
 import multiprocessing
 import traceback
-import pyvista as pv
-from build123d import *
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 from config import settings
 from tools.security import validate_code
+from tools.renderer import setup_headless
+from tools.time_limit import JobTimeout, call_with_time_limit
+from a2a.task_manager import register_artifact
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 # Context variable to track the current task ID
 task_id_var = contextvars.ContextVar("task_id", default=None)
+# Set by the control flow to collect the files of one attempt, which are only
+# registered for the task if that attempt wins
+attempt_files_var: contextvars.ContextVar[dict | None] = contextvars.ContextVar("attempt_files", default=None)
 
 OUTPUT_DIR = settings.OUTPUT_DIR
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+def output_subdir(name: str) -> str:
+    """Returns the shard directory for an output base name or task ID.
+
+    Outputs are spread over up to 256 subdirectories keyed on the first two
+    hex characters, so a scan for one task only reads a small directory.
+
+    Args:
+        name (str): The output base name or task ID.
+
+    Returns:
+        str: The subdirectory name relative to the output directory.
+    """
+    return name[:2]
+
+CAD_CACHE_DIR = os.path.join(OUTPUT_DIR, ".cad_cache")
+
+_executor: ProcessPoolExecutor | None = None
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Returns the CAD worker pool, creating it on first use.
+
+    Workers are long-lived so build123d (and PyVista, for previews) is loaded
+    once per worker rather than once per call. They are forked from a fork server
+    that has build123d preloaded, so a new or replacement worker starts without
+    importing it again, and without inheriting the API server's threads as a
+    plain fork would.
+    """
+    global _executor
+    if _executor is None:
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["build123d"])
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.CAD_WORKERS,
+            mp_context=context
+        )
+    return _executor
+
+def shutdown_executor(terminate: bool = False, executor: ProcessPoolExecutor | None = None) -> None:
+    """Shuts down the CAD worker pool if it was started.
+
+    Args:
+        terminate (bool): Kill the workers instead of letting running jobs finish.
+        executor (ProcessPoolExecutor | None): The pool a failed job ran in. It is only shut
+            down if it is still the current pool, not one already started to replace it.
+    """
+    global _executor
+    if _executor is None or (executor is not None and executor is not _executor):
+        return
+    if terminate:
+        # A job stuck past its time limit cannot be cancelled, only its process killed
+        for process in list(_executor._processes.values()):
+            process.terminate()
+    _executor.shutdown(wait=False, cancel_futures=True)
+    _executor = None
+
+# Seconds between checks whether a queued job has been handed to a worker
+_QUEUE_POLL_INTERVAL = 1
+# Extra seconds allowed past a job's limit for its worker's own alarm to fire first
+_ALARM_GRACE = 5
+
+def _submit_job(seconds: int, func, *args) -> tuple[ProcessPoolExecutor, Future]:
+    """Starts a job in the CAD worker pool under a time limit.
+
+    Args:
+        seconds (int): Time limit for the job.
+        func: The job function; must be picklable.
+        *args: Arguments for the job.
+
+    Returns:
+        tuple[ProcessPoolExecutor, Future]: The pool the job runs in and its future;
+            pass both to `_job_result`.
+    """
+    executor = _get_executor()
+    return executor, executor.submit(call_with_time_limit, seconds, func, *args)
+
+def _job_result(executor: ProcessPoolExecutor, future: Future, seconds: int) -> dict | None:
+    """Waits for a job started with `_submit_job`.
+
+    The job's own SIGALRM enforces its time limit. The watchdog here only catches a
+    worker the alarm cannot interrupt, and it does not count the time the job waited
+    in the queue behind other jobs.
+
+    Args:
+        executor (ProcessPoolExecutor): The pool the job was submitted to.
+        future (Future): The job's future.
+        seconds (int): The job's time limit.
+
+    Returns:
+        dict | None: The job's result, or None if it timed out.
+    """
+    try:
+        # Queued jobs are not stuck, so wait without a deadline until the pool takes the job
+        while True:
+            try:
+                return future.result(timeout=_QUEUE_POLL_INTERVAL)
+            except FutureTimeoutError:
+                if future.running():
+                    break
+        # A job marked running may still wait for one busy worker, whose job is itself
+        # bounded by its limit, so allow two limits before treating the worker as stuck
+        return future.result(timeout=2 * seconds + _ALARM_GRACE)
+    except JobTimeout:
+        return None
+    except FutureTimeoutError:
+        # The alarm could not interrupt the job (e.g. stuck in native code)
+        logger.error("CAD worker did not stop after %ss, restarting the pool", seconds)
+        shutdown_executor(terminate=True, executor=executor)
+        return None
+    except BrokenProcessPool:
+        # A worker died (e.g. a crash in OCCT or VTK); drop the pool so the next call starts a fresh one
+        shutdown_executor(executor=executor)
+        raise
+
+def _run_in_worker(seconds: int, func, *args) -> dict | None:
+    """Runs a job in the CAD worker pool and waits for it.
+
+    Args:
+        seconds (int): Time limit for the job.
+        func: The job function; must be picklable.
+        *args: Arguments for the job.
+
+    Returns:
+        dict | None: The job's result, or None if it timed out.
+    """
+    return _job_result(*_submit_job(seconds, func, *args), seconds)
+
+# Recent cache entries kept in memory in front of the on-disk index: key -> (stored at, files)
+_MODEL_CACHE_SIZE = 256
+_model_cache: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+
+def _cache_path(script_code: str) -> str:
+    """Returns the cache entry path for a script, keyed on its SHA-256."""
+    key = hashlib.sha256(script_code.encode()).hexdigest()
+    return os.path.join(CAD_CACHE_DIR, f"{key}.json")
+
+def _remember_model(path: str, stored_at: float, files: dict) -> None:
+    """Adds a cache entry to the in-memory LRU."""
+    _model_cache[path] = (stored_at, files)
+    _model_cache.move_to_end(path)
+    if len(_model_cache) > _MODEL_CACHE_SIZE:
+        _model_cache.popitem(last=False)
+
+def _lookup_cached_model(script_code: str) -> dict | None:
+    """Returns the files exported earlier for the same script.
+
+    Args:
+        script_code (str): The build123d script.
+
+    Returns:
+        dict | None: Mapping of file kind to path, or None if there is no fresh entry.
+    """
+    path = _cache_path(script_code)
+    entry = _model_cache.get(path)
+    try:
+        if entry is None:
+            entry = (os.path.getmtime(path), None)
+        if time.time() - entry[0] > settings.CAD_CACHE_TTL:
+            return None
+        files = entry[1]
+        if files is None:
+            with open(path) as f:
+                files = json.load(f)
+            _remember_model(path, entry[0], files)
+    except (OSError, ValueError):
+        return None
+    if not all(os.path.exists(p) for p in files.values()):
+        _model_cache.pop(path, None)
+        return None
+    return files
+
+def _store_cached_model(script_code: str, files: dict) -> None:
+    """Records the files exported for a script.
+
+    Args:
+        script_code (str): The build123d script.
+        files (dict): Mapping of file kind to path.
+    """
+    os.makedirs(CAD_CACHE_DIR, exist_ok=True)
+    path = _cache_path(script_code)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(files, f)
+    os.replace(tmp_path, path)
+    _remember_model(path, time.time(), files)
+
+def _copy_cached_model(files: dict, output_dir: str, base_name: str) -> dict:
+    """Links cached files under a new base name.
+
+    Hard links are used where possible; files are copied across file systems.
+
+    Args:
+        files (dict): Mapping of file kind to cached path.
+        output_dir (str): Directory for the new files.
+        base_name (str): Base name for the new files.
+
+    Returns:
+        dict: Mapping of file kind to new path.
+    """
+    copies = {}
+    for kind, src in files.items():
+        dst = os.path.join(output_dir, f"{base_name}.{kind}")
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copyfile(src, dst)
+        copies[kind] = dst
+    return copies
+
+# Errors are sent back from the workers and on to the Coder, so keep them short
+_TRACEBACK_FRAMES = 5
+_MAX_ERROR_CHARS = 4096
+
+def _format_error(message: str, e: Exception) -> str:
+    """Formats a worker error with the innermost frames of its traceback.
+
+    Args:
+        message (str): What failed.
+        e (Exception): The exception raised.
+
+    Returns:
+        str: The message, the exception and a traceback capped in frames and length.
+    """
+    details = "".join(traceback.format_exception(type(e), e, e.__traceback__, limit=-_TRACEBACK_FRAMES))
+    return f"{message}: {str(e)}\n{details[-_MAX_ERROR_CHARS:]}"
+
+@functools.cache
+def _build123d_scope() -> dict:
+    """Returns the public build123d symbols, collected once per worker process.
+
+    Only the names in `build123d.__all__` are exposed, the same set a script gets from
+    `from build123d import *`. `dir(build123d)` also lists the modules and OCP classes
+    build123d imports for itself, such as `os` and `sys`.
+    """
+    import build123d
+    return {name: getattr(build123d, name) for name in build123d.__all__}
+
 def _execute_and_export(script_code: str, output_dir: str, base_name: str) -> dict:
     """Execute code and export files in a separate process.
 
@@ -35,17 +284,19 @@ def _execute_and_export(script_code: str, output_dir: str, base_name: str) -> di
     Returns:
         dict: Result dictionary with success status and file paths.
     """
+    # Imported here so the API process never loads OCCT; workers have it preloaded
+    from build123d import export_step, export_stl
+
     try:
-        # Validate code before execution
-        validate_code(script_code)
+        # Validate code before execution; the compiled result is reused for exec
+        code = validate_code(script_code)
 
-        # Dynamically populate the execution scope with build123d symbols
+        # Populate the execution scope with build123d symbols
         # This avoids verbose explicit imports while ensuring a clean state
-        import build123d
-        local_scope = {name: getattr(build123d, name) for name in dir(build123d) if not name.startswith("_")}
+        local_scope = _build123d_scope().copy()
         
         # Execute the script
-        exec(script_code, {}, local_scope)
+        exec(code, {}, local_scope)
         
         # Look for 'result' or 'part'
         result_obj = local_scope.get("result") or local_scope.get("part")
@@ -60,7 +311,8 @@ def _execute_and_export(script_code: str, output_dir: str, base_name: str) -> di
         stl_path = os.path.join(output_dir, f"{base_name}.stl")
 
         export_step(result_obj, step_path)
-        export_stl(result_obj, stl_path)
+        # Binary STL is several times smaller than ASCII to write and for the renderers to parse
+        export_stl(result_obj, stl_path, ascii_format=False)
         
         return {
             "success": True,
@@ -72,9 +324,24 @@ def _execute_and_export(script_code: str, output_dir: str, base_name: str) -> di
     except Exception as e:
         return {
             "success": False, 
-            "error": f"Execution failed: {str(e)}\n{traceback.format_exc()}"
+            "error": _format_error("Execution failed", e)
         }
 
+def _register_files(task_id: str | None, files: dict) -> None:
+    """Registers exported files as the task's artifacts, or as the current attempt's.
+
+    Args:
+        task_id (str | None): The task identifier.
+        files (dict): Mapping of artifact kind to path.
+    """
+    attempt_files = attempt_files_var.get()
+    for kind, path in files.items():
+        filename = os.path.relpath(path, OUTPUT_DIR)
+        if attempt_files is not None:
+            attempt_files[kind] = filename
+        else:
+            register_artifact(task_id, kind, filename)
+
 def create_cad_model(script_code: str) -> dict:
     """Executes build123d code and exports STEP/STL.
 
@@ -93,77 +360,98 @@ def create_cad_model(script_code: str) -> dict:
     else:
         base_name = str(uuid.uuid4())
 
-    # Run in a separate process to allow timeout and isolation
-    with multiprocessing.Pool(processes=1) as pool:
-        async_result = pool.apply_async(_execute_and_export, (script_code, OUTPUT_DIR, base_name))
-        try:
-            # 120 second timeout
-            result = async_result.get(timeout=120)
-            return result
-        except multiprocessing.TimeoutError:
-            return {
-                "success": False, 
-                "error": "Execution timed out (120s limit). The model might be too complex."
-            }
-        except Exception as e:
-            return {
-                "success": False, 
-                "error": f"Process error: {str(e)}"
-            }
+    # Base names start with the task ID, so files of one task share a shard
+    output_dir = os.path.join(OUTPUT_DIR, output_subdir(base_name))
+    os.makedirs(output_dir, exist_ok=True)
+
+    # The script fully determines the model, so reuse the export of an identical script
+    cached = _lookup_cached_model(script_code) if settings.CAD_CACHE_TTL > 0 else None
+    if cached:
+        logger.info("Reusing cached model export for identical script")
+        files = _copy_cached_model(cached, output_dir, base_name)
+        _register_files(task_id, files)
+        return {"success": True, "files": files}
+
+    # Run in a worker process to allow timeout and isolation
+    try:
+        result = _run_in_worker(120, _execute_and_export, script_code, output_dir, base_name)
+    except Exception as e:
+        return {
+            "success": False, 
+            "error": f"Process error: {str(e)}"
+        }
+    if result is None:
+        return {
+            "success": False, 
+            "error": "Execution timed out (120s limit). The model might be too complex."
+        }
+    if result.get("success"):
+        _register_files(task_id, result["files"])
+        if settings.CAD_CACHE_TTL > 0 and all(os.path.exists(p) for p in result["files"].values()):
+            _store_cached_model(script_code, result["files"])
+    return result
+
+@functools.wraps(create_cad_model)
+async def create_cad_model_async(script_code: str) -> dict:
+    # ADK calls sync tools directly on the event loop, which would stall every other
+    # session for the whole build; wraps keeps the tool name and description the Coder sees
+    return await asyncio.to_thread(create_cad_model, script_code)
+
+# Preview views rendered by render_cad_model, by name -> Plotter method
+_VIEWS = {
+    "iso": "view_isometric",
+    "top": "view_xy",
+    "front": "view_xz", # Assuming Y-up or Z-up, adjust as needed
+    "right": "view_yz",
+}
 
-def _render_worker(stl_path: str, output_dir: str, base_name: str) -> dict:
-    """Render the STL in a separate process.
+@functools.lru_cache(maxsize=4)
+def _read_mesh(stl_path: str, mtime: float):
+    """Reads an STL once per worker; the modification time keeps rewritten files fresh."""
+    import pyvista as pv
+    return pv.read(stl_path)
+
+def _render_view(stl_path: str, output_dir: str, base_name: str, view: str) -> dict:
+    """Render one view of the STL in a worker process.
 
     Args:
         stl_path (str): Path to the STL file.
-        output_dir (str): Directory to save images.
-        base_name (str): Base name for output images.
+        output_dir (str): Directory to save the image.
+        base_name (str): Base name for the output image.
+        view (str): The view name, a key of `_VIEWS`.
 
     Returns:
-        dict: Result dictionary with success status and image paths.
+        dict: Result dictionary with success status and the image path.
     """
+    # Imported here so only the render workers load PyVista/VTK
+    import pyvista as pv
+
     try:
-        # Configure PyVista for headless rendering with EGL/OSMesa
-        pv.OFF_SCREEN = True
-        
-        # Force EGL or OSMesa if available (avoids X server requirement)
-        # Note: This requires libosmesa6-dev in Dockerfile
-        try:
-            pv.start_xvfb() # No-op if not needed, but safe to remove if using pure EGL
-        except:
-            pass
-            
+        # Configure PyVista for headless rendering, once per worker
+        setup_headless()
+
         plotter = pv.Plotter(off_screen=True)
-        mesh = pv.read(stl_path)
-        plotter.add_mesh(mesh, color="lightblue", show_edges=True)
+        plotter.add_mesh(_read_mesh(stl_path, os.path.getmtime(stl_path)), color="lightblue", show_edges=True)
         plotter.set_background("white")
 
-        # Views to generate
-        views = {
-            "iso": lambda p: p.view_isometric(),
-            "top": lambda p: p.view_xy(),
-            "front": lambda p: p.view_xz(), # Assuming Y-up or Z-up, adjust as needed
-            "right": lambda p: p.view_yz()
-        }
-
-        image_paths = []
-        for name, view_func in views.items():
-            view_func(plotter)
-            plotter.camera.zoom(1.2)
-            out_path = os.path.join(output_dir, f"{base_name}_{name}.png")
-            plotter.screenshot(out_path)
-            image_paths.append(out_path)
-        
+        # The view methods reset the camera, so the zoom applies to a fresh framing
+        getattr(plotter, _VIEWS[view])()
+        plotter.camera.zoom(1.2)
+        out_path = os.path.join(output_dir, f"{base_name}_{view}.png")
+        plotter.screenshot(out_path)
         plotter.close()
-        return {"success": True, "images": image_paths}
+        return {"success": True, "image": out_path}
 
     except Exception as e:
-        return {"success": False, "error": f"Rendering failed: {str(e)}\n{traceback.format_exc()}"}
+        return {"success": False, "error": _format_error("Rendering failed", e)}
+
+# A binary STL header and triangle count take 84 bytes, so anything shorter has no mesh
+_MIN_STL_SIZE = 84
 
 def render_cad_model(stl_path: str) -> dict:
     """Renders an STL file to PNG screenshots (Iso, Top, Front, Right).
 
-    Runs in a separate process to ensure VTK/OpenGL isolation.
+    Each view is rendered in a worker process to ensure VTK/OpenGL isolation.
 
     Args:
         stl_path (str): Path to the STL file.
@@ -171,25 +459,34 @@ def render_cad_model(stl_path: str) -> dict:
     Returns:
         dict: A dictionary containing 'success', 'error', and 'images' (list of paths).
     """
-    if not os.path.exists(stl_path):
+    try:
+        stl_size = os.stat(stl_path).st_size
+    except OSError:
         return {"success": False, "error": "STL file not found."}
+    # Fail here rather than after starting four render jobs
+    if stl_size < _MIN_STL_SIZE:
+        return {"success": False, "error": "STL file is empty or truncated."}
 
     base_name = os.path.splitext(os.path.basename(stl_path))[0]
 
-    # Run in a separate process
-    with multiprocessing.Pool(processes=1) as pool:
-        async_result = pool.apply_async(_render_worker, (stl_path, OUTPUT_DIR, base_name))
-        try:
-            # 30 second timeout for rendering
-            result = async_result.get(timeout=30)
+    # Keep the previews next to the STL in its shard directory
+    output_dir = os.path.dirname(stl_path) or OUTPUT_DIR
+
+    # The views are independent, so render them in parallel worker processes
+    try:
+        jobs = [_submit_job(30, _render_view, stl_path, output_dir, base_name, view) for view in _VIEWS]
+        results = [_job_result(executor, future, 30) for executor, future in jobs]
+    except Exception as e:
+        return {
+            "success": False, 
+            "error": f"Render process error: {str(e)}"
+        }
+    if any(result is None for result in results):
+        return {
+            "success": False, 
+            "error": "Rendering timed out (30s limit)."
+        }
+    for result in results:
+        if not result.get("success"):
             return result
-        except multiprocessing.TimeoutError:
-            return {
-                "success": False, 
-                "error": "Rendering timed out (30s limit)."
-            }
-        except Exception as e:
-            return {
-                "success": False, 
-                "error": f"Render process error: {str(e)}"
-            }
+    return {"success": True, "images": [result["image"] for result in results]}
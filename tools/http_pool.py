@@ -0,0 +1,31 @@
+"""Shared HTTP connection pool.
+
+This module provides a process-wide httpx.AsyncClient so outbound API calls
+made by the tools reuse keep-alive connections instead of opening new ones.
+"""
+
+from typing import Optional
+import httpx
+
+_client: Optional[httpx.AsyncClient] = None
+
+def get_client() -> httpx.AsyncClient:
+    """Returns the shared HTTP client, creating it on first use.
+
+    Returns:
+        httpx.AsyncClient: The shared client.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=10,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+        )
+    return _client
+
+async def aclose() -> None:
+    """Closes the shared HTTP client if it was created."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -6,15 +6,68 @@ store it in a vector database, and query it for relevant context.
 
 import os
 import asyncio
+import functools
+import hashlib
 import logging
-from bs4 import BeautifulSoup
+import threading
+from collections import OrderedDict
+import lxml.html
+from lxml import etree
 import chromadb
 from chromadb.utils import embedding_functions
-from playwright.async_api import async_playwright, BrowserContext
+from chromadb.utils.batch_utils import create_batches
 from config import settings
+from tools import http_pool, browser_pool
 
 logger = logging.getLogger(__name__)
 
+# Elements whose text is not page content
+_NON_TEXT_TAGS = frozenset({"script", "style", "template"})
+# Navigation and other page chrome left out of the extracted text
+_NOISE_TAGS = frozenset({"nav", "aside", "footer"})
+# Elements whose whitespace is kept as is
+_PRESERVE_WHITESPACE_TAGS = frozenset({"pre", "textarea"})
+
+def _text_nodes(element, skip: frozenset = frozenset(), preserve: bool = False):
+    """Yields the text under an element in document order, without comments or scripts.
+
+    Outside of pre blocks, whitespace-only text collapses to a single newline or space,
+    as BeautifulSoup's get_text does.
+
+    Args:
+        element: The lxml element.
+        skip: Tags whose content is left out; the text following them is kept.
+        preserve: Whether the element is inside a block that keeps its whitespace.
+    """
+    preserve = preserve or element.tag in _PRESERVE_WHITESPACE_TAGS
+    if element.tag not in _NON_TEXT_TAGS and element.text:
+        yield _collapse_whitespace(element.text, preserve)
+    for child in element:
+        # Comments and processing instructions have a non-string tag
+        if isinstance(child.tag, str) and child.tag not in skip:
+            yield from _text_nodes(child, skip, preserve)
+        if child.tail:
+            yield _collapse_whitespace(child.tail, preserve)
+
+def _collapse_whitespace(text: str, preserve: bool) -> str:
+    """Collapses whitespace-only text to a newline or a space unless it is preserved."""
+    if preserve or text.strip(" \n\t\f\r"):
+        return text
+    return "\n" if "\n" in text else " "
+
+# Quantized export shipped in the sentence-transformers model repositories
+_ONNX_INT8_MODEL = "onnx/model_qint8_avx512_vnni.onnx"
+
+# Characters per documentation chunk, and distance between the starts of consecutive chunks
+CHUNK_SIZE = 1500
+CHUNK_STRIDE = 1125
+
+# Number of recent query results kept per RAGTool, keyed by (query text, result count)
+_QUERY_CACHE_SIZE = 256
+
+# Set while documentation is being ingested, so queries do not see a partial index
+_ingesting = threading.Event()
+
 class RAGTool:
     """Manages documentation ingestion and retrieval."""
     def __init__(self, persist_directory: str = "rag_db"):
@@ -28,14 +81,60 @@ class RAGTool:
         
         # Use a more powerful model for embeddings
         self.model_name = settings.MODEL_NAME
-        self.embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=self.model_name)
+        self.embedding_backend = settings.EMBEDDING_BACKEND
+        backend_kwargs = {}
+        if self.embedding_backend == "onnx":
+            # int8 weights embed several times faster on CPU, for a negligible loss in recall
+            backend_kwargs = {"backend": "onnx", "model_kwargs": {"file_name": _ONNX_INT8_MODEL}}
+        self.embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
+            model_name=self.model_name, device=settings.EMBEDDING_DEVICE, **backend_kwargs
+        )
+        
+        self.collection = self._open_collection()
         
-        self.collection = self.client.get_or_create_collection(
+        self.urls = settings.BUILD123D_DOCS_URLS
+        self.fingerprint_path = os.path.join(self.persist_directory, "build123d_docs.fingerprint")
+        # Queries run in worker threads, so the LRU is guarded by a lock
+        self._query_cache: "OrderedDict[tuple[str, int], str]" = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+
+    def _open_collection(self) -> chromadb.Collection:
+        """Returns the documentation collection, creating it if it does not exist."""
+        return self.client.get_or_create_collection(
             name="build123d_docs",
             embedding_function=self.embedding_fn
         )
-        
-        self.urls = settings.BUILD123D_DOCS_URLS
+
+    def _fingerprint(self) -> str:
+        """Returns a hash of everything that determines the ingested corpus.
+
+        Returns:
+            str: Hex digest over the embedding model and backend, the chunking and the
+                documentation URLs.
+        """
+        h = hashlib.sha256(self.model_name.encode())
+        h.update(b"\0chunks=%d/%d" % (CHUNK_SIZE, CHUNK_STRIDE))
+        if self.embedding_backend != "torch":
+            # Only added for other backends, so DBs built with torch keep their fingerprint
+            h.update(b"\0backend=" + self.embedding_backend.encode())
+        for url in self.urls:
+            h.update(b"\0" + url.encode())
+        return h.hexdigest()
+
+    def _read_fingerprint(self) -> str | None:
+        """Returns the fingerprint of the ingested corpus, or None if none was recorded."""
+        try:
+            with open(self.fingerprint_path) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def _write_fingerprint(self, fingerprint: str) -> None:
+        """Atomically records the fingerprint of the ingested corpus."""
+        tmp_path = f"{self.fingerprint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(fingerprint)
+        os.replace(tmp_path, self.fingerprint_path)
 
     async def _process_page_content(self, content_html: str) -> str | None:
         """Parses HTML content and extracts relevant text.
@@ -46,38 +145,61 @@ class RAGTool:
         Returns:
             The extracted text content, or None if no main content is found.
         """
-        soup = BeautifulSoup(content_html, 'html.parser')
-        
+        try:
+            doc = lxml.html.document_fromstring(content_html)
+        except etree.ParserError:
+            return None
+
         # Extract text from main content
-        content = soup.find('div', {'role': 'main'}) or soup.find('article') or soup.body
-        
-        if not content:
+        found = doc.xpath('//div[@role="main"]') or doc.xpath('//article') or doc.xpath('//body')
+        if not found:
             return None
-        
-        # Remove navigation and other noise if possible
-        for nav in content.find_all(['nav', 'aside', 'footer']):
-            nav.decompose()
+        content = found[0]
 
         # Pre-process code blocks to preserve formatting
-        for code_block in content.find_all('pre'):
+        for code_block in list(content.iter('pre')):
             # Preserve line breaks from br tags
-            for br in code_block.find_all('br'):
-                br.replace_with('\n')
-            
+            for br in code_block.iter('br'):
+                br.tail = "\n" + (br.tail or "")
+
             # Preserve line breaks from block elements
-            for block in code_block.find_all(['div', 'p', 'li']):
-                block.append('\n')
-                
-            code_text = code_block.get_text()
-            code_block.replace_with(f"\n```python\n{code_text}\n```\n")
+            for block in code_block.iter('div', 'p', 'li'):
+                if len(block):
+                    block[-1].tail = (block[-1].tail or "") + "\n"
+                else:
+                    block.text = (block.text or "") + "\n"
+
+            code_text = "".join(_text_nodes(code_block, skip=_NOISE_TAGS, preserve=True))
+            code_block.clear(keep_tail=True)
+            code_block.text = f"\n```python\n{code_text}\n```\n"
 
-        return content.get_text(separator="\n")
+        # Leave out navigation and other noise
+        in_pre = any(parent.tag in _PRESERVE_WHITESPACE_TAGS for parent in content.iterancestors())
+        return "\n".join(_text_nodes(content, skip=_NOISE_TAGS, preserve=in_pre))
 
-    async def _fetch_url_content(self, context: BrowserContext, url: str) -> str | None:
-        """Fetches content from a URL using Playwright.
+    async def _fetch_url_content(self, url: str) -> str | None:
+        """Fetches a page over plain HTTP and extracts its text.
+
+        Args:
+            url: The URL to fetch.
+
+        Returns:
+            The extracted text content of the page, or None if fetching failed or the
+            page has no main content without running its JavaScript.
+        """
+        try:
+            logger.info(f"Fetching {url}...")
+            response = await http_pool.get_client().get(url, timeout=60, follow_redirects=True)
+            response.raise_for_status()
+            return await self._process_page_content(response.text)
+        except Exception as e:
+            logger.warning(f"Failed to fetch {url}: {e}")
+            return None
+
+    async def _render_url_content(self, url: str) -> str | None:
+        """Fetches content from a URL using a page from the shared browser.
 
         Args:
-            context: The Playwright browser context.
             url: The URL to fetch.
 
         Returns:
@@ -85,23 +207,40 @@ class RAGTool:
         """
         try:
             logger.info(f"Scraping {url}...")
-            page = await context.new_page()
-            # Use domcontentloaded to be faster and avoid timeouts on heavy pages
-            await page.goto(url, wait_until="domcontentloaded", timeout=60000)
-            
-            # Get content
-            content_html = await page.content()
-            await page.close()
-            
+            async with browser_pool.get_pool().page() as page:
+                # Use domcontentloaded to be faster and avoid timeouts on heavy pages
+                await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+
+                # Get content
+                content_html = await page.content()
+
             return await self._process_page_content(content_html)
             
         except Exception as e:
             logger.error(f"Failed to scrape {url}: {e}")
             return None
 
-    def _store_chunks(self, chunks: list[str], ids: list[str], metadatas: list[dict]) -> None:
+    async def _render_urls(self, urls: list[str]) -> list[str | None]:
+        """Scrapes pages in a headless browser, for pages that need JavaScript.
+
+        Pages are rendered concurrently, as many at a time as the browser pool lends out.
+
+        Args:
+            urls: The URLs to scrape.
+
+        Returns:
+            The extracted text content of each page, or None where scraping failed.
+        """
+        return await asyncio.gather(*(self._render_url_content(url) for url in urls))
+
+    async def _store_chunks(self, chunks: list[str], ids: list[str], metadatas: list[dict]) -> None:
         """Stores document chunks in the vector database.
 
+        All chunks are embedded in one call in a worker thread, so the event loop stays
+        responsive and the model batches the whole corpus itself. The chunks are then
+        written in as few inserts as Chroma allows, since each insert is its own SQLite
+        transaction.
+
         Args:
             chunks: List of text chunks.
             ids: List of unique IDs for the chunks.
@@ -112,115 +251,141 @@ class RAGTool:
             return
 
         logger.info(f"Adding {len(chunks)} chunks to DB...")
-        # Add in batches to avoid hitting limits
-        batch_size = 100
-        for i in range(0, len(chunks), batch_size):
-            end = min(i + batch_size, len(chunks))
-            self.collection.add(
-                documents=chunks[i:end],
-                ids=ids[i:end],
-                metadatas=metadatas[i:end]
+        embeddings = await asyncio.to_thread(self.embedding_fn, chunks)
+
+        for batch_ids, batch_embeddings, batch_metadatas, batch_chunks in create_batches(
+            api=self.client, ids=ids, embeddings=embeddings, metadatas=metadatas, documents=chunks
+        ):
+            await asyncio.to_thread(
+                self.collection.add,
+                ids=batch_ids,
+                embeddings=batch_embeddings,
+                metadatas=batch_metadatas,
+                documents=batch_chunks
             )
         logger.info("Ingestion complete.")
 
     async def ingest_docs(self) -> None:
-        """Scrapes the configured URLs using Playwright and populates the vector DB."""
-        if self.collection.count() > 0:
-            logger.info("RAG DB already populated. Skipping ingestion.")
-            return
+        """Scrapes the configured URLs and populates the vector DB.
+
+        Ingestion is skipped when the DB already holds the corpus for the current
+        URL list and embedding model; if either changed, the DB is rebuilt.
+        """
+        fingerprint = self._fingerprint()
+        populated = self.collection.count() > 0
+        if populated:
+            stored = self._read_fingerprint()
+            if stored is None:
+                # DB populated before fingerprints were recorded; adopt it as is
+                self._write_fingerprint(fingerprint)
+                stored = fingerprint
+            if stored == fingerprint:
+                logger.info("RAG DB already populated. Skipping ingestion.")
+                return
 
-        logger.info("Ingesting documentation with Playwright...")
+        _ingesting.set()
+        with self._query_cache_lock:
+            self._query_cache.clear()
+        try:
+            if populated:
+                logger.info("Documentation sources changed. Rebuilding RAG DB...")
+                # Recreate rather than empty the collection, as it keeps the embedding
+                # dimension of the model it was built with
+                self.client.delete_collection("build123d_docs")
+                self.collection = self._open_collection()
+            await self._ingest(fingerprint)
+        finally:
+            _ingesting.clear()
+
+    async def _ingest(self, fingerprint: str) -> None:
+        """Scrapes the configured URLs, stores the chunks and records the fingerprint.
+
+        Args:
+            fingerprint: The fingerprint of the corpus being ingested.
+        """
+        logger.info("Ingesting documentation...")
         all_chunks = []
         all_ids = []
         all_metadatas = []
         
         doc_id_counter = 0
         
-        logger.info("Starting Playwright...")
-        async with async_playwright() as p:
-            logger.info("Launching browser...")
-            browser = await p.chromium.launch(
-                headless=True,
-                args=['--no-sandbox', '--disable-setuid-sandbox']
-            )
-            logger.info("Browser launched. Creating context...")
-            context = await browser.new_context()
+        # Fetch the pages concurrently, bounded so the docs host is not flooded
+        semaphore = asyncio.Semaphore(settings.RAG_FETCH_CONCURRENCY)
+
+        async def fetch(url: str) -> str | None:
+            async with semaphore:
+                return await self._fetch_url_content(url)
+
+        texts = await asyncio.gather(*(fetch(url) for url in self.urls))
+
+        # The Sphinx docs are static HTML, so a browser is only started for pages that need one
+        missing = [url for url, text in zip(self.urls, texts) if not text]
+        if missing:
+            logger.info(f"Falling back to Playwright for {len(missing)} pages...")
+            rendered = dict(zip(missing, await self._render_urls(missing)))
+            texts = [text or rendered[url] for url, text in zip(self.urls, texts)]
+
+        # Store the chunks whenever a full insert's worth is pending, so memory stays bounded
+        flush_size = self.client.get_max_batch_size()
+        stored = 0
+
+        for url, text in zip(self.urls, texts):
+            if not text:
+                logger.warning(f"Could not find main content for {url}")
+                continue
             
-            for url in self.urls:
-                text = await self._fetch_url_content(context, url)
-                
-                if not text:
-                    logger.warning(f"Could not find main content for {url}")
-                    continue
-                
-                # Simple chunking
-                chunks = self._chunk_text(text)
-                
-                for i, chunk in enumerate(chunks):
-                    all_chunks.append(chunk)
-                    all_ids.append(f"doc_{doc_id_counter}_{i}")
-                    all_metadatas.append({"source": url, "chunk_id": i})
-                
-                doc_id_counter += 1
+            # Simple chunking
+            chunks = self._chunk_text(text)
             
-            await browser.close()
+            for i, chunk in enumerate(chunks):
+                all_chunks.append(chunk)
+                all_ids.append(f"doc_{doc_id_counter}_{i}")
+                all_metadatas.append({"source": url, "chunk_id": i})
+            
+            doc_id_counter += 1
+
+            if len(all_chunks) >= flush_size:
+                await self._store_chunks(all_chunks, all_ids, all_metadatas)
+                stored += len(all_chunks)
+                all_chunks, all_ids, all_metadatas = [], [], []
+
+        if all_chunks or not stored:
+            await self._store_chunks(all_chunks, all_ids, all_metadatas)
+        if stored or all_chunks:
+            self._write_fingerprint(fingerprint)
 
-        self._store_chunks(all_chunks, all_ids, all_metadatas)
+    def _chunk_text(self, text: str, chunk_size: int = CHUNK_SIZE, stride: int = CHUNK_STRIDE) -> list[str]:
+        """Splits text into overlapping windows of a fixed size.
 
-    def _chunk_text(self, text: str, chunk_size: int = 1500, overlap: int = 200) -> list[str]:
-        """Splits text into chunks with overlap, respecting code blocks and paragraphs.
+        Windows start every `stride` characters and the last one ends with the text, so any
+        passage of up to `chunk_size - stride` characters lies whole within some chunk.
 
         Args:
             text: The text to chunk.
-            chunk_size: The maximum size of each chunk.
-            overlap: The number of characters to overlap between chunks.
+            chunk_size: The size of each chunk.
+            stride: The distance between the starts of consecutive chunks.
 
         Returns:
             A list of text chunks.
         """
-        chunks = []
-        start = 0
-        text_len = len(text)
-
-        while start < text_len:
-            end = start + chunk_size
-            
-            if end >= text_len:
-                chunks.append(text[start:])
-                break
-            
-            # Try to find a good split point backwards from 'end'
-            # We want to split at a natural boundary
-            
-            split_point = -1
-            search_limit = max(start, end - overlap)
-            
-            # 1. Split after a code block (```\n)
-            code_block_end = text.rfind("```\n", search_limit, end)
-            if code_block_end != -1:
-                split_point = code_block_end + 4
-            
-            # 2. Split at double newline
-            if split_point == -1:
-                double_newline = text.rfind("\n\n", search_limit, end)
-                if double_newline != -1:
-                    split_point = double_newline + 2
-            
-            # 3. Split at single newline
-            if split_point == -1:
-                newline = text.rfind("\n", search_limit, end)
-                if newline != -1:
-                    split_point = newline + 1
-            
-            # 4. Fallback: hard split
-            if split_point == -1:
-                split_point = end
-            
-            chunks.append(text[start:split_point])
-            start = split_point
-            
+        if len(text) <= chunk_size:
+            return [text]
+        chunks = [text[i:i + chunk_size] for i in range(0, len(text) - chunk_size, stride)]
+        chunks.append(text[-chunk_size:])
         return chunks
 
+    def warm_up(self) -> None:
+        """Runs one query so the first real query does not pay for loading.
+
+        Loads the HNSW index from disk and runs the embedding model once, which
+        initializes it lazily.
+        """
+        try:
+            self.collection.query(query_texts=["build123d"], n_results=1)
+        except Exception as e:
+            logger.warning(f"RAG Tool: Warm-up query failed: {e}")
+
     def query(self, query_text: str, n_results: int = 2) -> str:
         """Queries the vector DB for relevant context.
 
@@ -231,6 +396,16 @@ class RAGTool:
         Returns:
             A string containing the concatenated context from relevant documents.
         """
+        if _ingesting.is_set():
+            return "The build123d documentation is still being indexed. Please try again shortly."
+
+        key = (query_text, n_results)
+        with self._query_cache_lock:
+            cached = self._query_cache.get(key)
+            if cached is not None:
+                self._query_cache.move_to_end(key)
+                return cached
+
         try:
             logger.info(f"RAG Tool: Querying for '{query_text}'")
             results = self.collection.query(
@@ -243,12 +418,29 @@ class RAGTool:
                 return "No relevant documentation found."
             
             logger.info(f"RAG Tool: Found {len(results['documents'][0])} results.")
-            for i, (doc, meta) in enumerate(zip(results['documents'][0], results['metadatas'][0])):
-                logger.debug(f"RAG Result {i+1}: Source={meta.get('source', 'unknown')}, ChunkID={meta.get('chunk_id', 'unknown')}")
-                logger.debug(f"RAG Content Snippet: {doc[:200]}...")
+            if logger.isEnabledFor(logging.DEBUG):
+                for i, (doc, meta) in enumerate(zip(results['documents'][0], results['metadatas'][0])):
+                    logger.debug(f"RAG Result {i+1}: Source={meta.get('source', 'unknown')}, ChunkID={meta.get('chunk_id', 'unknown')}")
+                    logger.debug(f"RAG Content Snippet: {doc[:200]}...")
 
             context = "\n\n".join(results['documents'][0])
+            with self._query_cache_lock:
+                self._query_cache[key] = context
+                if len(self._query_cache) > _QUERY_CACHE_SIZE:
+                    self._query_cache.popitem(last=False)
             return context
         except Exception as e:
             logger.error(f"RAG Tool: Query failed with error: {e}")
             return f"RAG Query failed: {e}"
+
+@functools.cache
+def get_rag_tool() -> RAGTool:
+    """Return the process-wide RAGTool, creating it on first use.
+
+    The agents, the semantic cache and startup ingestion share it, so the
+    Chroma client and the embedding model are only loaded once.
+
+    Returns:
+        RAGTool: The shared RAG tool.
+    """
+    return RAGTool()
@@ -1,45 +1,103 @@
 """Renderer utility for STL files.
 
-This module provides a function to render STL files to PNG images using PyVista.
+This module provides a function to render STL files to preview images using PyVista,
+and an async wrapper that runs it in a worker process so the CPU-bound rendering
+does not block the event loop.
 """
 
 import os
-import pyvista as pv
+import asyncio
+import hashlib
+import functools
+import logging
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import Optional
+from config import settings
+from tools.time_limit import JobTimeout, call_with_time_limit
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+# PNG paths of recent renders keyed by a digest of the STL contents, so a retry that
+# produces an identical model does not render it again
+_RENDER_CACHE_SIZE = 32
+_render_cache: "OrderedDict[str, str]" = OrderedDict()
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Returns the render worker pool, creating it on first use.
+
+    Workers are spawned rather than forked so they do not inherit the
+    server's threads or any VTK/OpenGL state.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.RENDER_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+def shutdown_executor() -> None:
+    """Shuts down the render worker pool if it was started."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+# The render is only looked at by the Designer, so a small JPEG is enough and much cheaper
+# to read back and encode than a full-size PNG
+PREVIEW_SIZE = (512, 512)
+PREVIEW_JPEG_QUALITY = 85
+# Seconds a preview render may take before its worker interrupts it
+RENDER_TIME_LIMIT = 30
+
+@functools.cache
+def setup_headless() -> None:
+    """Configures PyVista for off-screen rendering, once per worker process.
+
+    Without a display, VTK is pointed at its EGL render window, which renders
+    headless without an X server (VTK 9.4+ wheels ship it).
+    """
+    import pyvista as pv
+
+    pv.OFF_SCREEN = True
+    if os.name == 'posix' and "DISPLAY" not in os.environ:
+        # Read when a render window is created, so it takes effect for the first Plotter
+        os.environ.setdefault("VTK_DEFAULT_OPENGL_WINDOW", "vtkEGLRenderWindow")
 
 def render_stl(stl_path: str, output_path: Optional[str] = None) -> Optional[str]:
-    """Renders an STL file to a PNG image using PyVista.
+    """Renders an STL file to a preview image using PyVista.
 
     Args:
         stl_path (str): Path to the STL file.
-        output_path (Optional[str]): Path to save the image. If None, uses STL path with .png extension.
+        output_path (Optional[str]): Path to save the image; the format follows the extension.
+            If None, uses STL path with .jpg extension.
 
     Returns:
         Optional[str]: The path to the generated image, or None if failed.
     """
     if not os.path.exists(stl_path):
-        print(f"Error: STL file not found at {stl_path}")
+        logger.error("STL file not found at %s", stl_path)
         return None
 
     if output_path is None:
-        output_path = stl_path.replace(".stl", ".png")
+        output_path = stl_path.replace(".stl", ".jpg")
 
-    try:
-        # Start Xvfb if running on Linux and no display is set
-        if os.name == 'posix' and "DISPLAY" not in os.environ:
-            try:
-                pv.start_xvfb()
-            except Exception as e:
-                print(f"Warning: Could not start Xvfb: {e}")
+    # Imported here so only the render workers load PyVista/VTK, not the server
+    import pyvista as pv
 
-        # Configure PyVista for headless rendering
-        pv.OFF_SCREEN = True
+    try:
+        setup_headless()
 
         # Read the STL file
         mesh = pv.read(stl_path)
 
         # Create a plotter
-        plotter = pv.Plotter(off_screen=True)
+        plotter = pv.Plotter(off_screen=True, window_size=list(PREVIEW_SIZE))
         plotter.add_mesh(mesh, color="lightblue", show_edges=True)
         plotter.set_background("white")
         
@@ -47,10 +105,60 @@ def render_stl(stl_path: str, output_path: Optional[str] = None) -> Optional[str
         plotter.view_isometric()
         
         # Save screenshot
-        plotter.screenshot(output_path)
+        frame = plotter.screenshot(return_img=True)
         plotter.close()
+        from PIL import Image
+        Image.fromarray(frame).save(output_path, quality=PREVIEW_JPEG_QUALITY)
         
         return output_path
     except Exception as e:
-        print(f"Error rendering STL: {e}")
+        logger.error("Error rendering STL: %s", e)
         return None
+
+def _stl_digest(stl_path: str) -> Optional[str]:
+    """Returns a digest of the STL file contents, or None if it cannot be read."""
+    try:
+        with open(stl_path, "rb") as f:
+            return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+    except OSError:
+        return None
+
+async def render_stl_async(stl_path: str, output_path: Optional[str] = None) -> Optional[str]:
+    """Renders an STL file in a worker process without blocking the event loop.
+
+    When no output path is given, an STL with the same contents as a recent render
+    reuses that render's image.
+
+    Args:
+        stl_path (str): Path to the STL file.
+        output_path (Optional[str]): Path to save the image. If None, uses STL path with .jpg extension.
+
+    Returns:
+        Optional[str]: The path to the generated image, or None if failed.
+    """
+    digest = await asyncio.to_thread(_stl_digest, stl_path) if output_path is None else None
+    cached = _render_cache.get(digest) if digest else None
+    if cached and os.path.exists(cached):
+        logger.info("Reusing render of identical STL: %s", cached)
+        _render_cache.move_to_end(digest)
+        return cached
+
+    loop = asyncio.get_running_loop()
+    try:
+        png_path = await loop.run_in_executor(
+            _get_executor(), call_with_time_limit, RENDER_TIME_LIMIT, render_stl, stl_path, output_path
+        )
+    except JobTimeout:
+        logger.error("Rendering %s timed out (%ss limit)", stl_path, RENDER_TIME_LIMIT)
+        return None
+    except BrokenProcessPool as e:
+        # A worker died (e.g. a crash inside VTK); drop the pool so the next call starts a fresh one
+        logger.error(f"Render worker pool crashed: {e}")
+        shutdown_executor()
+        return None
+
+    if digest and png_path:
+        _render_cache[digest] = png_path
+        if len(_render_cache) > _RENDER_CACHE_SIZE:
+            _render_cache.popitem(last=False)
+    return png_path
@@ -4,28 +4,79 @@ This module provides the SearchTools class which interfaces with Google Custom S
 and DuckDuckGo to perform web and image searches, and fetch web page content.
 """
 
-import os
-import requests
+import asyncio
+import functools
+import logging
+import orjson
 from duckduckgo_search import DDGS
 from typing import List, Dict
-from playwright.async_api import async_playwright
 from bs4 import BeautifulSoup
+from tools import http_pool, browser_pool
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Pages whose static HTML has less text than this are rendered in the browser
+_MIN_STATIC_TEXT = 500
+# Limit on returned page text, to avoid context overflow
+_MAX_PAGE_TEXT = 20000
+
+def _page_text(html: str) -> str:
+    """Extracts the readable text of a page, one phrase per line.
+
+    Args:
+        html (str): The page HTML.
+
+    Returns:
+        str: The text without scripts, styles and page chrome.
+    """
+    soup = BeautifulSoup(html, 'lxml')
+    
+    # Remove script and style elements
+    for script in soup(["script", "style", "nav", "footer", "header", "aside"]):
+        script.decompose()
+        
+    # Get text
+    text = soup.get_text()
+    
+    # Break into lines and remove leading/trailing space on each
+    lines = (line.strip() for line in text.splitlines())
+    # Break multi-headlines into a line each
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    # Drop blank lines
+    return '\n'.join(chunk for chunk in chunks if chunk)
 
 class SearchTools:
     """Provides web search, image search, and page fetching capabilities."""
     def __init__(self):
         """Initialize SearchTools with API keys."""
-        self.google_api_key = os.getenv("GOOGLE_API_KEY")
-        self.google_cse_id = os.getenv("GOOGLE_CSE_ID")
+        self.google_api_key = settings.GOOGLE_API_KEY
+        self.google_cse_id = settings.GOOGLE_CSE_ID
         self.ddgs = None
         
         if not self.google_api_key or not self.google_cse_id:
-            print("Google Search keys not found. Falling back to DuckDuckGo.")
+            logger.info("Google Search keys not found. Falling back to DuckDuckGo.")
             self.ddgs = DDGS()
         else:
-            print("Google Custom Search enabled.")
+            logger.info("Google Custom Search enabled.")
+
+    async def _google_request(self, params: dict) -> dict:
+        """Calls the Google Custom Search API.
+
+        Args:
+            params (dict): Query parameters besides the API key and engine ID.
 
-    def web_search(self, query: str, max_results: int = 5) -> str:
+        Returns:
+            dict: The decoded JSON response.
+        """
+        response = await http_pool.get_client().get(
+            "https://www.googleapis.com/customsearch/v1",
+            params={"key": self.google_api_key, "cx": self.google_cse_id, **params}
+        )
+        response.raise_for_status()
+        return orjson.loads(response.content)
+
+    async def web_search(self, query: str, max_results: int = 5) -> str:
         """General web search using Google Custom Search or DuckDuckGo.
 
         Args:
@@ -36,11 +87,11 @@ class SearchTools:
             str: Formatted search results.
         """
         if self.google_api_key and self.google_cse_id:
-            return self._google_search(query, max_results)
+            return await self._google_search(query, max_results)
         else:
-            return self._ddg_search(query, max_results)
+            return await asyncio.to_thread(self._ddg_search, query, max_results)
 
-    def image_search(self, query: str, max_results: int = 3) -> List[str]:
+    async def image_search(self, query: str, max_results: int = 3) -> List[str]:
         """Image search using Google Custom Search or DuckDuckGo.
 
         Args:
@@ -51,22 +102,13 @@ class SearchTools:
             List[str]: A list of image URLs.
         """
         if self.google_api_key and self.google_cse_id:
-            return self._google_image_search(query, max_results)
+            return await self._google_image_search(query, max_results)
         else:
-            return self._ddg_image_search(query, max_results)
+            return await asyncio.to_thread(self._ddg_image_search, query, max_results)
 
-    def _google_search(self, query: str, max_results: int) -> str:
+    async def _google_search(self, query: str, max_results: int) -> str:
         try:
-            url = "https://www.googleapis.com/customsearch/v1"
-            params = {
-                "key": self.google_api_key,
-                "cx": self.google_cse_id,
-                "q": query,
-                "num": max_results
-            }
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
+            data = await self._google_request({"q": query, "num": max_results})
             
             results = data.get("items", [])
             if not results:
@@ -77,24 +119,14 @@ class SearchTools:
                 formatted.append(f"Title: {res.get('title')}\nLink: {res.get('link')}\nSnippet: {res.get('snippet')}\n")
             return "\n".join(formatted)
         except Exception as e:
-            print(f"Google Search failed: {e}. Falling back to DuckDuckGo.")
+            logger.warning("Google Search failed: %s. Falling back to DuckDuckGo.", e)
             if not self.ddgs:
                 self.ddgs = DDGS()
-            return self._ddg_search(query, max_results)
+            return await asyncio.to_thread(self._ddg_search, query, max_results)
 
-    def _google_image_search(self, query: str, max_results: int) -> List[str]:
+    async def _google_image_search(self, query: str, max_results: int) -> List[str]:
         try:
-            url = "https://www.googleapis.com/customsearch/v1"
-            params = {
-                "key": self.google_api_key,
-                "cx": self.google_cse_id,
-                "q": query,
-                "num": max_results,
-                "searchType": "image"
-            }
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
+            data = await self._google_request({"q": query, "num": max_results, "searchType": "image"})
             
             results = data.get("items", [])
             if not results:
@@ -102,10 +134,10 @@ class SearchTools:
             
             return [res.get("link") for res in results if res.get("link")]
         except Exception as e:
-            print(f"Google Image Search failed: {e}. Falling back to DuckDuckGo.")
+            logger.warning("Google Image Search failed: %s. Falling back to DuckDuckGo.", e)
             if not self.ddgs:
                 self.ddgs = DDGS()
-            return self._ddg_image_search(query, max_results)
+            return await asyncio.to_thread(self._ddg_image_search, query, max_results)
 
     def _ddg_search(self, query: str, max_results: int) -> str:
         try:
@@ -132,11 +164,37 @@ class SearchTools:
             
             return [res.get("image") for res in results if res.get("image")]
         except Exception as e:
-            print(f"DuckDuckGo Image Search failed: {e}")
+            logger.warning("DuckDuckGo Image Search failed: %s", e)
             return []
 
+    async def _fetch_static_page(self, url: str) -> str | None:
+        """Fetches a page over plain HTTP and extracts its text.
+
+        Args:
+            url (str): The URL to fetch.
+
+        Returns:
+            str | None: The text content, or None if the page could not be fetched or
+                has too little text without running its JavaScript.
+        """
+        try:
+            response = await http_pool.get_client().get(
+                url, timeout=15, follow_redirects=True, headers={"User-Agent": browser_pool.USER_AGENT}
+            )
+            response.raise_for_status()
+        except Exception as e:
+            logger.info("Plain fetch of %s failed, using the browser: %s", url, e)
+            return None
+        if "html" not in response.headers.get("content-type", ""):
+            return None
+        text = _page_text(response.text)
+        return text if len(text) >= _MIN_STATIC_TEXT else None
+
     async def fetch_page(self, url: str) -> str:
-        """Fetches the content of a URL and returns the text using Playwright.
+        """Fetches the content of a URL and returns the text.
+
+        The page is fetched over plain HTTP first; the shared browser is only used for
+        pages that need JavaScript to show their content.
 
         Args:
             url (str): The URL to fetch.
@@ -144,46 +202,31 @@ class SearchTools:
         Returns:
             str: The text content of the page.
         """
-        
+        text = await self._fetch_static_page(url)
+        if text is not None:
+            return text[:_MAX_PAGE_TEXT]
+
         try:
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(
-                    headless=True,
-                    args=['--no-sandbox', '--disable-setuid-sandbox']
-                )
-                context = await browser.new_context(
-                    user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-                )
-                page = await context.new_page()
-                
+            async with browser_pool.get_pool().page() as page:
                 # Use domcontentloaded for speed, but wait a bit for dynamic content if needed
                 try:
                     await page.goto(url, wait_until="domcontentloaded", timeout=20000)
                 except Exception as e:
-                    print(f"Page load timeout/error: {e}")
+                    logger.warning("Page load timeout/error: %s", e)
                     # Continue anyway, we might have partial content
                 
                 content = await page.content()
-                await browser.close()
-            
-            soup = BeautifulSoup(content, 'html.parser')
-            
-            # Remove script and style elements
-            for script in soup(["script", "style", "nav", "footer", "header", "aside"]):
-                script.decompose()
-                
-            # Get text
-            text = soup.get_text()
-            
-            # Break into lines and remove leading/trailing space on each
-            lines = (line.strip() for line in text.splitlines())
-            # Break multi-headlines into a line each
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            # Drop blank lines
-            text = '\n'.join(chunk for chunk in chunks if chunk)
-            
-            # Limit length to avoid context overflow
-            return text[:20000] 
+
+            return _page_text(content)[:_MAX_PAGE_TEXT]
             
         except Exception as e:
             return f"Failed to fetch page {url}: {e}"
+
+@functools.cache
+def get_search_tools() -> SearchTools:
+    """Return the process-wide SearchTools, creating it on first use.
+
+    Returns:
+        SearchTools: The shared search tools.
+    """
+    return SearchTools()
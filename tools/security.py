@@ -5,6 +5,8 @@ that generated code only uses allowed libraries and operations.
 """
 
 import ast
+import builtins
+import types
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,24 +15,32 @@ class SecurityViolation(Exception):
     """Exception raised when code violates security rules."""
     pass
 
-class CodeValidator(ast.NodeVisitor):
-    """AST visitor to validate Python code against security rules."""
+class CodeValidator:
+    """Validates Python code against security rules by checking its AST nodes."""
 
     ALLOWED_IMPORTS = {"build123d", "math"}
     ALLOWED_BUILTINS = {
         "print", "range", "len", "int", "float", "str", "list", "dict", "tuple", 
         "set", "bool", "enumerate", "zip", "min", "max", "abs", "sum", "round"
     }
+    DENIED_BUILTINS = frozenset({"open", "exec", "eval", "__import__", "input", "compile", "globals", "locals"})
+    DENIED_ATTRS = frozenset({"__builtins__", "__globals__", "__class__", "__base__", "__subclasses__"})
+    BUILTIN_NAMES = frozenset(dir(builtins))
+    # Validation stops after this many violations; the script is rejected either way
+    MAX_ERRORS = 32
     
     def __init__(self):
         self.errors = []
 
-    def validate(self, code: str) -> None:
+    def validate(self, code: str) -> types.CodeType:
         """Validates the given code string.
 
         Args:
             code (str): The Python code to validate.
 
+        Returns:
+            types.CodeType: The code compiled from the validated tree, ready to `exec`.
+
         Raises:
             SecurityViolation: If the code contains disallowed operations.
             SyntaxError: If the code is not valid Python.
@@ -40,61 +50,62 @@ class CodeValidator(ast.NodeVisitor):
         except SyntaxError as e:
             raise SyntaxError(f"Invalid Python code: {e}")
 
-        self.visit(tree)
+        for node in ast.walk(tree):
+            node_type = type(node)
+            if node_type is ast.Call:
+                self._check_call(node)
+            elif node_type is ast.Attribute:
+                self._check_attribute(node)
+            elif node_type is ast.Import:
+                self._check_import(node)
+            elif node_type is ast.ImportFrom:
+                self._check_import_from(node)
+            elif node_type is ast.Global:
+                self.errors.append("Global statement is not allowed.")
+            elif node_type is ast.Nonlocal:
+                self.errors.append("Nonlocal statement is not allowed.")
+            if len(self.errors) >= self.MAX_ERRORS:
+                break
 
         if self.errors:
             raise SecurityViolation("\n".join(self.errors))
 
-    def visit_Import(self, node: ast.Import):
+        return compile(tree, "<cad>", "exec")
+
+    def _check_import(self, node: ast.Import):
         for alias in node.names:
             if alias.name.split('.')[0] not in self.ALLOWED_IMPORTS:
                 self.errors.append(f"Importing '{alias.name}' is not allowed.")
-        self.generic_visit(node)
 
-    def visit_ImportFrom(self, node: ast.ImportFrom):
+    def _check_import_from(self, node: ast.ImportFrom):
         if node.module and node.module.split('.')[0] not in self.ALLOWED_IMPORTS:
             self.errors.append(f"Importing from '{node.module}' is not allowed.")
-        self.generic_visit(node)
 
-    def visit_Call(self, node: ast.Call):
+    def _check_call(self, node: ast.Call):
         # Check for calls to disallowed built-in functions
         if isinstance(node.func, ast.Name):
-            if node.func.id not in self.ALLOWED_BUILTINS and node.func.id in __builtins__:
+            if node.func.id not in self.ALLOWED_BUILTINS and node.func.id in self.BUILTIN_NAMES:
                  # It's a builtin but not in our allowed list (e.g. open, exec, eval)
-                 # Note: This check is a bit loose because __builtins__ can be a dict or module
-                 # and we are checking against the current environment's builtins.
-                 # A stricter check would be to have a DENY_LIST.
-                 
-                 # Let's use a DENY_LIST approach for critical ones to be safe and explicit
-                 if node.func.id in {"open", "exec", "eval", "__import__", "input", "compile", "globals", "locals"}:
+                 # Use a DENY_LIST for the critical ones to be safe and explicit
+                 if node.func.id in self.DENIED_BUILTINS:
                      self.errors.append(f"Calling function '{node.func.id}' is not allowed.")
 
-        self.generic_visit(node)
-
-    def visit_Attribute(self, node: ast.Attribute):
+    def _check_attribute(self, node: ast.Attribute):
         # Disallow access to dangerous attributes
-        if node.attr in {"__builtins__", "__globals__", "__class__", "__base__", "__subclasses__"}:
+        if node.attr in self.DENIED_ATTRS:
             self.errors.append(f"Accessing attribute '{node.attr}' is not allowed.")
-        self.generic_visit(node)
-        
-    def visit_Exec(self, node):
-        # Python 2 compatibility (though ast.parse might fail on Py3 for Exec node, good to have)
-        self.errors.append("Exec statement is not allowed.")
-        
-    def visit_Global(self, node):
-        self.errors.append("Global statement is not allowed.")
-        
-    def visit_Nonlocal(self, node):
-        self.errors.append("Nonlocal statement is not allowed.")
 
-def validate_code(code: str) -> None:
+def validate_code(code: str) -> types.CodeType:
     """Helper function to validate code using CodeValidator.
     
     Args:
         code (str): The code to validate.
+
+    Returns:
+        types.CodeType: The compiled code, so callers do not parse it again.
         
     Raises:
         SecurityViolation: If validation fails.
     """
     validator = CodeValidator()
-    validator.validate(code)
+    return validator.validate(code)
@@ -0,0 +1,124 @@
+"""Semantic cache for generation results.
+
+This module provides the SemanticCache class, which stores approved results
+keyed on the normalized prompt, so near-duplicate requests can be answered
+without running the agent workflow again.
+"""
+
+import os
+import re
+import json
+import hashlib
+import time
+import uuid
+import logging
+from typing import Dict, Optional
+from config import settings
+from tools.rag_tool import get_rag_tool
+
+logger = logging.getLogger(__name__)
+
+# A number with the unit written after it, e.g. "10 mm", "2.5in" or "45°"
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)?(?:\s*(?:mm|cm|m|in|inch|inches|ft|deg|degrees|°|%|\")(?![a-z]))?")
+
+def _normalize(prompt: str) -> str:
+    """Lowercases a prompt and collapses its whitespace."""
+    return " ".join(prompt.lower().split())
+
+def _numeric_tokens(normalized: str) -> str:
+    """Returns the numbers of a normalized prompt with their units, in order.
+
+    Prompts that differ only in a dimension embed almost identically, so these
+    must match exactly for a cache hit.
+    """
+    return " ".join("".join(match.split()) for match in _NUMBER_RE.findall(normalized))
+
+class SemanticCache:
+    """Stores approved results in a Chroma collection using cosine distance.
+
+    The normalized prompt is the embedded document; its numeric tokens, the
+    response text, the generated file names and the creation time are kept in
+    its metadata. A hit needs the numeric tokens to match exactly, so the
+    embedding only picks among prompts asking for the same dimensions.
+
+    Attributes:
+        threshold (float): Minimum cosine similarity for a cache hit.
+        ttl (int): Seconds a cached result stays valid.
+    """
+
+    def __init__(self, threshold: float = settings.SEMANTIC_CACHE_THRESHOLD, ttl: int = settings.SEMANTIC_CACHE_TTL):
+        """Initialize SemanticCache.
+
+        Args:
+            threshold (float): Minimum cosine similarity for a cache hit.
+            ttl (int): Seconds a cached result stays valid.
+        """
+        self.threshold = threshold
+        self.ttl = ttl
+        # Share the RAG store's client and embedding model
+        rag = get_rag_tool()
+        # Vectors from different models are not comparable, so each model gets its own entries
+        model_key = hashlib.sha256(settings.MODEL_NAME.encode()).hexdigest()[:16]
+        self.collection = rag.client.get_or_create_collection(
+            name=f"semantic_cache_{model_key}",
+            embedding_function=rag.embedding_fn,
+            metadata={"hnsw:space": "cosine"}
+        )
+
+    def lookup(self, prompt: str) -> Optional[Dict]:
+        """Find a cached result for a similar prompt.
+
+        Args:
+            prompt (str): The user's request.
+
+        Returns:
+            Optional[Dict]: {"response": str, "files": {kind: filename}} on a hit, else None.
+        """
+        if self.collection.count() == 0:
+            return None
+
+        normalized = _normalize(prompt)
+        results = self.collection.query(
+            query_texts=[normalized],
+            n_results=1,
+            where={"$and": [
+                {"numbers": _numeric_tokens(normalized)},
+                {"ts": {"$gte": time.time() - self.ttl}},
+            ]}
+        )
+        if not results["ids"] or not results["ids"][0]:
+            return None
+
+        similarity = 1 - results["distances"][0][0]
+        if similarity < self.threshold:
+            return None
+
+        metadata = results["metadatas"][0][0]
+        files = json.loads(metadata["files"])
+        # The cached files must still be downloadable
+        if not all(os.path.exists(os.path.join(settings.OUTPUT_DIR, name)) for name in files.values()):
+            return None
+
+        logger.info(f"Semantic cache hit (similarity {similarity:.3f})")
+        return {"response": metadata["response"], "files": files}
+
+    def store(self, prompt: str, response: str, files: Dict[str, str]) -> None:
+        """Cache an approved result and drop expired entries.
+
+        Args:
+            prompt (str): The user's request.
+            response (str): The final response text.
+            files (Dict[str, str]): Mapping of artifact kind to file name inside the output directory.
+        """
+        normalized = _normalize(prompt)
+        self.collection.add(
+            ids=[uuid.uuid4().hex],
+            documents=[normalized],
+            metadatas=[{
+                "numbers": _numeric_tokens(normalized),
+                "response": response,
+                "files": json.dumps(files),
+                "ts": time.time(),
+            }]
+        )
+        self.collection.delete(where={"ts": {"$lt": time.time() - self.ttl}})
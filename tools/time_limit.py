@@ -0,0 +1,38 @@
+"""Time limits for jobs run in worker processes.
+
+A job is interrupted inside its worker with SIGALRM, so the worker is free for
+the next job and the pool does not have to be restarted.
+"""
+
+import signal
+
+class JobTimeout(BaseException):
+    """Raised inside a worker when a job exceeds its time limit.
+
+    A BaseException so the job's own `except Exception` handlers do not swallow it.
+    """
+
+def call_with_time_limit(seconds: int, func, *args):
+    """Runs `func(*args)` in a worker, interrupting it with SIGALRM after `seconds`.
+
+    Args:
+        seconds (int): Time limit for the job.
+        func: The job function.
+        *args: Arguments for the job.
+
+    Returns:
+        The job's return value.
+
+    Raises:
+        JobTimeout: If the job ran past its time limit.
+    """
+    def on_alarm(signum, frame):
+        raise JobTimeout()
+
+    previous = signal.signal(signal.SIGALRM, on_alarm)
+    signal.alarm(seconds)
+    try:
+        return func(*args)
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, previous)